@@ -12,6 +12,29 @@ class BaseAgent():
         '''
         pass
 
+    def attachEnvironment(self, env):
+        # called when the script is added to an environment wrapper, before any agents are added
+        '''
+        INPUTS:
+        env is the RaiderEnvironment being played. scripts should only read from it, e.g. to
+        take a snapshot with env.getState() for planning, and never step or modify it
+
+        no outputs necessary
+        '''
+        pass
+
+    def seed(self, seed):
+        # seed the script's random number generator, called when the game is reset with a seed
+        '''
+        INPUTS:
+        seed is an int. scripts that make random decisions should draw them from their own
+        generator (e.g. random.Random(seed)) instead of the global random module, so games
+        with the same seed play out identically
+
+        no outputs necessary
+        '''
+        pass
+
     def addAgent(self, id_):
         # register new agent id that this script will be controlling
         '''
@@ -39,6 +39,7 @@ class BasicAgent(BaseAgent):
             self.patience = -1
 
     def __init__(self):
+        self.rng = random.Random()
         self.solid_objects = ("spike", "stonewall", "woodwall", "turret", "stone", "tree", "bush")
         self.structures = ("spike", "stonewall", "woodwall", "turret")
 
@@ -54,6 +55,12 @@ class BasicAgent(BaseAgent):
         self.agent_states = {}
         self.agent_ids = []
 
+    def seed(self, seed):
+        # a seeded game starts every agent from scratch, so it plays out the same as in a fresh process
+        self.rng.seed(seed)
+        for id_ in self.agent_ids:
+            self.agent_states[id_] = self.AgentState(self, id_)
+
     def addAgent(self, id_):
         self.agent_states[id_] = self.AgentState(self, id_)
         self.agent_ids.append(id_)
@@ -162,7 +169,7 @@ class BasicAgent(BaseAgent):
                             self.moveTowardsPos(obj.position, away=True)
 
         # autoheal
-        if self.obs.self.health <= 15 and self.obs.self.food >= 15 and random.random() < 0.05:
+        if self.obs.self.health <= 15 and self.obs.self.food >= 15 and self.rng.random() < 0.05:
             self.state.action[2] = 9
             self.state.action[3] = 1
         # autoapproach heals
@@ -334,7 +341,7 @@ class BasicAgent(BaseAgent):
                 target_pos = self_pos
                 for i in range(15):
                     buffer = 750
-                    target_pos = (random.randint(0+buffer, map_size-buffer), random.randint(0+buffer, map_size-buffer))
+                    target_pos = (self.rng.randint(0+buffer, map_size-buffer), self.rng.randint(0+buffer, map_size-buffer))
                     if dist2(self_pos, target_pos) > wander_distance_threshold**2:
                         break
             else:
@@ -345,7 +352,7 @@ class BasicAgent(BaseAgent):
                 target_pos = self_pos
                 for i in range(15):
                     buffer = 200
-                    target_pos = (random.randint(0+buffer, map_size-buffer), random.randint(0+buffer, map_size-buffer))
+                    target_pos = (self.rng.randint(0+buffer, map_size-buffer), self.rng.randint(0+buffer, map_size-buffer))
                     if dist2(self_pos, target_pos) > wander_distance_threshold**2:
                         break
             
@@ -517,7 +524,7 @@ class BasicAgent(BaseAgent):
         self.pointToTarget(target.position)
         if dist > melee_threshold:
             if not self.objectsInWay(target.position, 5):
-                if self.obs.self.health < 8 and random.random() < 0.1:
+                if self.obs.self.health < 8 and self.rng.random() < 0.1:
                     self.state.action[2] = 5
                     self.state.action[3] = 1
                 else:
@@ -526,7 +533,7 @@ class BasicAgent(BaseAgent):
                 self.state.action[2] = 3
                 self.pointToTarget(target.position, away=True)
         else:
-            if not self.lowOnResources(20) and random.random() < 0.3 and self.placeSpike(target.position):
+            if not self.lowOnResources(20) and self.rng.random() < 0.3 and self.placeSpike(target.position):
                 return
             else:
                 self.state.action[2] = 1
@@ -587,7 +594,7 @@ class BasicAgent(BaseAgent):
                     self.state.action[3] = 1
                     self.moveTowardsPos(closest_enemy.position, away=True)
                     return
-                elif random.random() < 0.2 :
+                elif self.rng.random() < 0.2 :
                     self.state.action[2] = 5
                     self.state.action[3] = 1
                     return
@@ -638,11 +645,11 @@ class BasicAgent(BaseAgent):
                 self.state.action[2] = 1
                 self.state.action[3] = 1
                 return
-            if dist < spike_threshold and random.random() < 0.1 and self.placeSpike(closest_enemy.position):
+            if dist < spike_threshold and self.rng.random() < 0.1 and self.placeSpike(closest_enemy.position):
                 self.moveTowardsPos(closest_enemy.position)
                 return
             if dist < range_threshold and not self.objectsInWay(closest_enemy.position) and self.obs.self.wood > 15:
-                if random.random() < 0.1 and self.placeSpike(closest_enemy.position):
+                if self.rng.random() < 0.1 and self.placeSpike(closest_enemy.position):
                     self.state.action[2] = 5
                 else:
                     self.state.action[2] = 2
@@ -661,7 +668,7 @@ class BasicAgent(BaseAgent):
                             structure_between_target = True
                             break
 
-                    if not structure_between_target and random.random() < 0.2:
+                    if not structure_between_target and self.rng.random() < 0.2:
                         self.pointToTarget(enemy.position)
                         self.moveTowardsPos(enemy.position)
                         self.state.action[2] = 5
@@ -719,7 +726,7 @@ class BasicAgent(BaseAgent):
                             structure_between_target = True
                             break
 
-                    if not structure_between_target and random.random() < 0.2:
+                    if not structure_between_target and self.rng.random() < 0.2:
                         self.pointToTarget(enemy.position)
                         self.moveTowardsPos(enemy.position)
                         self.state.action[2] = 5
@@ -900,13 +907,13 @@ class BasicAgent(BaseAgent):
         dx, dy = math.cos(angle_rad), math.sin(angle_rad)
         if dx > dy:
             ax = 2 if dx > 0 else 0
-            if random.random() < abs(dy):
+            if self.rng.random() < abs(dy):
                 ay = 2 if dy > 0 else 0
             else:
                 ay = 1
         else:
             ay = 2 if dy > 0 else 0
-            if random.random() < abs(dx):
+            if self.rng.random() < abs(dx):
                 ax = 2 if dx > 0 else 0
             else:
                 ax = 1
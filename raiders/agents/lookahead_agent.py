@@ -0,0 +1,147 @@
+import random, time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+
+from agents.base_agent import BaseAgent
+from raiders import RaiderEnvironment
+
+
+NOOP = (1, 1, 0, 0, 2)
+
+# headless environment that rollouts are simulated in, one per process
+ROLLOUT_ENV = None
+
+def getRolloutEnv():
+    global ROLLOUT_ENV
+    if ROLLOUT_ENV is None:
+        ROLLOUT_ENV = RaiderEnvironment(render_mode=None, obs_mode=None)
+    return ROLLOUT_ENV
+
+def scoreState(env, id_):
+    # how good the game looks for player id_, from its team's point of view
+    player = env.players[id_]
+    score = 0
+    for other in env.players.values():
+        health = max(other.health, 0)
+        score += health if other.team == player.team else -health
+    score += 2*max(player.health, 0) + 10*player.kills
+    score += 0.02*(player.food + player.wood + player.stone)
+    base = max(env.base.health, 0)
+    score += 0.2*base if player.team == 1 else -0.2*base
+    return score
+
+def evaluateCandidates(state, id_, candidates, horizon, deadline):
+    # roll each candidate out from state while time is left, the other players stand still
+    env = getRolloutEnv()
+    scores = []
+    for action in candidates:
+        if time.time() >= deadline:
+            break
+        env.setState(state)
+        actions = {other: NOOP for other in env.players}
+        actions[id_] = action
+        for _ in range(horizon):
+            _, _, done, _, _ = env.step(actions)
+            if done:
+                break
+        scores.append(scoreState(env, id_))
+    return scores
+
+
+class LookaheadAgent(BaseAgent):
+    '''
+    Picks actions by simulating them. Every tick the game is snapshotted with env.getState() and,
+    for each controlled player, candidate actions are held for horizon steps in a headless copy of
+    the game and scored (team health, kills, resources, base health). The best candidate found
+    within time_budget seconds per tick is played, candidates that did not fit in the budget are
+    skipped, so the latency per tick stays bounded.
+
+    workers > 0 spreads the players over a process pool, otherwise rollouts run in process.
+    '''
+
+    def __init__(self, time_budget=0.05, horizon=6, samples=16, workers=0):
+        self.time_budget = time_budget
+        self.horizon = horizon
+        self.samples = samples
+        self.workers = workers
+        self.pool = None
+        self.env = None
+        self.rng = random.Random()
+
+    def initialize(self, team):
+        self.team = 1 if team=="defender" else 2
+        self.agent_ids = []
+        self.actions = {}
+
+    def attachEnvironment(self, env):
+        self.env = env
+
+    def seed(self, seed):
+        self.rng.seed(seed)
+        self.actions = {}
+
+    def addAgent(self, id_):
+        self.agent_ids.append(id_)
+        return f"LookaheadAgent{id_}"
+
+    def removeAgent(self, id_):
+        self.agent_ids.remove(id_)
+        self.actions.pop(id_, None)
+
+    def getCandidates(self, id_):
+        # the previous choice first, then every move with and without attacking, then random samples
+        candidates = []
+        if id_ in self.actions:
+            candidates.append(tuple(self.actions[id_]))
+        for ax in range(3):
+            for ay in range(3):
+                for attack in range(2):
+                    candidates.append((ax, ay, 0, attack, 2))
+        for _ in range(self.samples):
+            candidates.append((
+                self.rng.randint(0, 2), self.rng.randint(0, 2), self.rng.randint(0, 9),
+                self.rng.randint(0, 1), self.rng.randint(0, 4),
+            ))
+        return list(dict.fromkeys(candidates))
+
+    def getPool(self):
+        if self.pool is None:
+            # workers build their rollout env on start up, ticks until then keep the previous actions
+            self.pool = ProcessPoolExecutor(self.workers, initializer=getRolloutEnv)
+        return self.pool
+
+    def handleTeamObservation(self, team_observation):
+        ids = [id_ for id_ in self.agent_ids if id_ in self.env.players and self.env.players[id_].health > 0]
+        if not ids:
+            return
+        start = time.time()
+        deadline = start + self.time_budget
+        state = self.env.getState()
+        candidates = {id_: self.getCandidates(id_) for id_ in ids}
+
+        scores = {}
+        if self.workers > 0:
+            pool = self.getPool()
+            futures = {id_: pool.submit(evaluateCandidates, state, id_, candidates[id_], self.horizon, deadline) for id_ in ids}
+            for id_, future in futures.items():
+                try:
+                    # workers stop starting rollouts at the deadline, allow for the one in flight
+                    scores[id_] = future.result(timeout=max(0, deadline - time.time()) + self.time_budget/4)
+                except TimeoutError:
+                    future.cancel()
+        else:
+            for i, id_ in enumerate(ids):
+                # split what is left of the budget evenly between the remaining players
+                share = (deadline - time.time()) / (len(ids) - i)
+                scores[id_] = evaluateCandidates(state, id_, candidates[id_], self.horizon, time.time() + share)
+
+        for id_ in ids:
+            if scores.get(id_):
+                best = max(range(len(scores[id_])), key=scores[id_].__getitem__)
+                self.actions[id_] = list(candidates[id_][best])
+
+    def getAction(self, observation, id_):
+        return list(self.actions.get(id_, NOOP))
+
+    def __del__(self):
+        if self.pool is not None:
+            self.pool.shutdown(wait=False, cancel_futures=True)
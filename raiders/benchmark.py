@@ -0,0 +1,193 @@
+'''
+Step throughput benchmark.
+
+Runs fixed seed games between BasicAgent teams and reports steps/sec, per phase time and peak
+memory for every scenario. Results are printed and can be written as JSON to compare versions:
+
+    python benchmark.py --output before.json
+    python benchmark.py --output after.json --compare before.json
+
+Phases, in ms per step:
+    logic: RaiderEnvironment.step minus rendering and observation building
+    render: drawing the world (only with a render mode, or when image observations are requested)
+    observations: building the per player observations
+    agents: handleTeamObservation and getAction of every agent script
+'''
+
+import os, time, json, math, random, platform, argparse, tracemalloc
+from collections import defaultdict
+
+import numpy as np
+import pygame
+
+from env_utils import RaiderEnvironmentWrapper, AgentScripts
+from raiders import Turret, StoneWall, WoodWall, Spike
+
+
+def fortifyLateGame(wrapper, rng):
+    # skip to just before the storm starts closing in, with both teams dug in around the base
+    env = wrapper.env
+    env.t = 175*20
+    center = np.array(env.center, dtype=np.float64)
+    for team in (1, 2):
+        players = [player for player in env.getPlayers() if player.team == team]
+        for player in players:
+            player.food, player.wood, player.stone = 500, 500, 500
+        radius = 150 if team == 1 else 450
+        for i in range(12):
+            theta = 2*math.pi*i/12 + rng.random()*0.2
+            pos = center + (radius+60)*np.array((math.cos(theta), math.sin(theta)))
+            env.addDynamicObject(Turret(env, tuple(pos), theta, team, players[i % len(players)]))
+        for i in range(36):
+            theta = 2*math.pi*i/36
+            pos = center + radius*np.array((math.cos(theta), math.sin(theta)))
+            wall = StoneWall if team == 1 else WoodWall
+            env.addObject(wall(env, tuple(pos), team))
+        for i in range(16):
+            theta = 2*math.pi*(i+0.5)/16
+            pos = center + (radius-40)*np.array((math.cos(theta), math.sin(theta)))
+            env.addDynamicObject(Spike(env, tuple(pos), team, players[i % len(players)]))
+
+
+SCENARIOS = {
+    "2v2_early": {"defenders": 2, "raiders": 2, "ticks": 600, "setup": None},
+    "5v10": {"defenders": 5, "raiders": 10, "ticks": 600, "setup": None},
+    "late_storm": {"defenders": 5, "raiders": 10, "ticks": 600, "setup": fortifyLateGame},
+}
+
+
+class PhaseTimer():
+    def __init__(self):
+        self.totals = defaultdict(float)
+
+    def wrap(self, obj, name, phase):
+        # replace obj.name with a timed version, works on instances so nothing else is affected
+        func = getattr(obj, name)
+        totals = self.totals
+
+        def timed(*args, **kwargs):
+            t = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                totals[phase] += time.perf_counter() - t
+        setattr(obj, name, timed)
+
+    def reset(self):
+        self.totals.clear()
+
+
+def createGame(scenario, seed, render_mode):
+    config = SCENARIOS[scenario]
+    wrapper = RaiderEnvironmentWrapper(mode="god", render_mode=render_mode)
+    wrapper.loadAgentScripts([
+        (AgentScripts.BasicAgent(), config["defenders"], "defender"),
+        (AgentScripts.BasicAgent(), config["raiders"], "raider"),
+    ])
+    wrapper.reset(seed=seed)
+    if config["setup"] is not None:
+        config["setup"](wrapper, random.Random(seed))
+    return wrapper
+
+def runGame(wrapper, ticks):
+    steps = 0
+    for _ in range(ticks):
+        observations, winning_team, done, term, info = wrapper.step()
+        steps += 1
+        if done:
+            wrapper.reset()
+    return steps
+
+def runScenario(scenario, seed=0, ticks=None, render_mode=None, memory=True):
+    ticks = ticks or SCENARIOS[scenario]["ticks"]
+
+    wrapper = createGame(scenario, seed, render_mode)
+    timer = PhaseTimer()
+    env = wrapper.env
+    timer.wrap(env, "step", "step")
+    timer.wrap(env, "render", "render")
+    timer.wrap(env, "getObservations", "observations")
+    for script in wrapper.scripts:
+        timer.wrap(script, "handleTeamObservation", "agents")
+        timer.wrap(script, "getAction", "agents")
+
+    timer.reset()
+    t = time.perf_counter()
+    steps = runGame(wrapper, ticks)
+    elapsed = time.perf_counter() - t
+    totals = dict(timer.totals)
+
+    # rendering and observations happen inside env.step, report logic as the remainder
+    phases = {
+        "logic": totals.get("step", 0) - totals.get("render", 0) - totals.get("observations", 0),
+        "render": totals.get("render", 0),
+        "observations": totals.get("observations", 0),
+        "agents": totals.get("agents", 0),
+    }
+    result = {
+        "ticks": steps,
+        "seed": seed,
+        "render_mode": render_mode,
+        "seconds": elapsed,
+        "steps_per_sec": steps / elapsed,
+        "phase_ms": {phase: 1000*total/steps for phase, total in phases.items()},
+    }
+
+    if memory:
+        # tracemalloc slows everything down, so memory is measured on a separate identical run
+        wrapper = createGame(scenario, seed, render_mode)
+        tracemalloc.start()
+        runGame(wrapper, ticks)
+        result["peak_memory_mb"] = tracemalloc.get_traced_memory()[1] / 2**20
+        tracemalloc.stop()
+    return result
+
+def machineInfo():
+    return {
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pygame": pygame.version.ver,
+        "platform": platform.platform(),
+        "processor": platform.processor(),
+        "cpu_count": os.cpu_count(),
+    }
+
+def printResult(scenario, result, baseline=None):
+    line = f"{scenario:<12} {result['steps_per_sec']:8.1f} steps/s"
+    if baseline is not None:
+        line += f" ({result['steps_per_sec']/baseline['steps_per_sec']:.2f}x)"
+    line += "  " + "  ".join(f"{phase} {ms:.2f}ms" for phase, ms in result["phase_ms"].items())
+    if "peak_memory_mb" in result:
+        line += f"  peak {result['peak_memory_mb']:.1f}MB"
+    print(line)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure RaiderEnvironment step throughput")
+    parser.add_argument("--scenario", action="append", choices=tuple(SCENARIOS), help="scenario to run, can be repeated, defaults to all")
+    parser.add_argument("--ticks", type=int, default=None, help="override the number of steps per scenario")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--render-mode", default="None", choices=("None", "rgb_array", "human"))
+    parser.add_argument("--no-memory", action="store_true", help="skip the tracemalloc peak memory run")
+    parser.add_argument("--output", help="write results as JSON to this file")
+    parser.add_argument("--compare", help="JSON results of a previous run to compare steps/sec against")
+    args = parser.parse_args()
+
+    render_mode = None if args.render_mode == "None" else args.render_mode
+    baseline = {}
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)["scenarios"]
+
+    results = {
+        "machine": machineInfo(),
+        "scenarios": {},
+    }
+    for scenario in args.scenario or SCENARIOS:
+        result = runScenario(scenario, args.seed, args.ticks, render_mode, not args.no_memory)
+        results["scenarios"][scenario] = result
+        printResult(scenario, result, baseline.get(scenario))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
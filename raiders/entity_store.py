@@ -0,0 +1,117 @@
+import numpy as np
+
+
+# type ids used by the entity store, 0 marks an empty slot
+ENTITY_KINDS = (
+    "player", "base", "spike", "stonewall", "woodwall", "turret", "stone", "tree", "bush",
+    "explosion", "frag", "bullet", "chargedarrow", "arrow", "heal",
+)
+KIND_TO_ID = {kind: i+1 for i, kind in enumerate(ENTITY_KINDS)}
+ID_TO_KIND = {i: kind for kind, i in KIND_TO_ID.items()}
+
+
+class EntityStore():
+    '''
+    Structure of arrays copy of every entity in a RaiderEnvironment.
+
+    Each entity owns a slot (obj.slot) in contiguous NumPy arrays holding position, size, health,
+    team, angle and type id. The objects stay the source of truth and act as views onto their slot:
+    the environment registers them as they are added and removed, and calls sync() once per step so
+    bulk queries see the state at the end of the game logic.
+
+    Used by the storm damage pass and ObservationEncoder (tensor observations) and available to
+    agents through env.entities. Collision resolution and the dict observations of getInputs keep
+    walking the grid, whose visiting order they depend on.
+    '''
+
+    def __init__(self, capacity=512):
+        self.capacity = 0
+        self.pos = np.zeros((0, 2), dtype=np.float64)
+        self.size = np.zeros(0, dtype=np.float64)
+        self.health = np.zeros(0, dtype=np.float64)
+        self.angle = np.zeros(0, dtype=np.float64)
+        self.team = np.zeros(0, dtype=np.int8)
+        self.type_id = np.zeros(0, dtype=np.int8)
+        self.alive = np.zeros(0, dtype=bool)
+        self.objects = []
+        self.free = []
+        self.grow(capacity)
+
+    def grow(self, capacity):
+        extra = capacity - self.capacity
+        self.pos = np.concatenate((self.pos, np.zeros((extra, 2))))
+        self.size = np.concatenate((self.size, np.zeros(extra)))
+        self.health = np.concatenate((self.health, np.zeros(extra)))
+        self.angle = np.concatenate((self.angle, np.zeros(extra)))
+        self.team = np.concatenate((self.team, np.full(extra, -1, dtype=np.int8)))
+        self.type_id = np.concatenate((self.type_id, np.zeros(extra, dtype=np.int8)))
+        self.alive = np.concatenate((self.alive, np.zeros(extra, dtype=bool)))
+        self.objects.extend([None]*extra)
+        # pop from the back so low slots are handed out first
+        self.free = list(range(capacity-1, self.capacity-1, -1)) + self.free
+        self.capacity = capacity
+
+    def add(self, obj):
+        if getattr(obj, "slot", -1) >= 0 and self.objects[obj.slot] is obj:
+            return obj.slot
+        if not self.free:
+            self.grow(2*self.capacity)
+        slot = self.free.pop()
+        obj.slot = slot
+        self.objects[slot] = obj
+        self.type_id[slot] = KIND_TO_ID[obj.kind]
+        self.alive[slot] = True
+        self.update(obj)
+        return slot
+
+    def remove(self, obj):
+        slot = getattr(obj, "slot", -1)
+        if slot < 0 or self.objects[slot] is not obj:
+            return
+        self.objects[slot] = None
+        self.alive[slot] = False
+        self.type_id[slot] = 0
+        self.team[slot] = -1
+        self.free.append(slot)
+        obj.slot = -1
+
+    def update(self, obj):
+        slot = obj.slot
+        self.pos[slot] = obj.pos
+        self.size[slot] = obj.size
+        self.health[slot] = getattr(obj, "health", 0)
+        self.angle[slot] = getattr(obj, "angle", 0)
+        self.team[slot] = getattr(obj, "team", -1)
+
+    def sync(self):
+        # refresh every live slot from its object in one pass
+        slots = self.slots()
+        objects = [self.objects[slot] for slot in slots]
+        if not objects:
+            return
+        self.pos[slots] = [obj.pos for obj in objects]
+        self.size[slots] = [obj.size for obj in objects]
+        self.health[slots] = [getattr(obj, "health", 0) for obj in objects]
+        self.angle[slots] = [getattr(obj, "angle", 0) for obj in objects]
+        self.team[slots] = [getattr(obj, "team", -1) for obj in objects]
+
+    def slots(self, kinds=None):
+        mask = self.alive
+        if kinds is not None:
+            mask = mask & np.isin(self.type_id, [KIND_TO_ID[kind] for kind in kinds])
+        return np.flatnonzero(mask)
+
+    def view(self, slot):
+        return self.objects[slot]
+
+    def queryRadius(self, pos, radius, kinds=None):
+        # slots of entities whose center lies within radius of pos
+        slots = self.slots(kinds)
+        d = self.pos[slots] - np.asarray(pos, dtype=np.float64)
+        return slots[np.einsum("ij,ij->i", d, d) <= radius*radius]
+
+    def queryBox(self, pos, half_width, kinds=None):
+        # slots of entities whose center lies in the axis aligned box around pos
+        slots = self.slots(kinds)
+        d = np.abs(self.pos[slots] - np.asarray(pos, dtype=np.float64))
+        return slots[(d[:, 0] <= half_width) & (d[:, 1] <= half_width)]
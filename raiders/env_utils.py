@@ -49,10 +49,11 @@ def convAngleToAction(player_angle, target_angle):
 class RaiderEnvironmentWrapper():
     def __init__(
         self,
-        mode = "god"
+        mode = "god",
+        render_mode = "human"
     ):
         self.mode = mode
-        self.env = RaiderEnvironment()
+        self.env = RaiderEnvironment(render_mode=render_mode)
 
         self.food_img = pygame.image.load("assets/food.png")
         self.wood_img = pygame.image.load("assets/wood.png")
@@ -79,6 +80,7 @@ class RaiderEnvironmentWrapper():
 
     def addScript(self, script, team):
         script.initialize(team)
+        script.attachEnvironment(self.env)
         script.__team__ = team
         self.scripts.append(script)
 
@@ -128,9 +130,13 @@ class RaiderEnvironmentWrapper():
         del self.active_ids[id_]
         del self.actions[id_]
 
-    def reset(self):
+    def reset(self, seed=None):
+        # a seed fixes the map, spawns and agent scripts, script i is seeded with seed+i+1
         self.actions = {id_: [1, 1, 0, 0, 2] for id_ in self.env.players.keys()}
-        observations, info = self.env.reset()
+        if seed is not None:
+            for i, script in enumerate(self.scripts):
+                script.seed(seed+i+1)
+        observations, info = self.env.reset(seed=seed)
 
         for script in self.scripts:
             team = script.__team__
@@ -142,7 +148,7 @@ class RaiderEnvironmentWrapper():
             action = script.getAction(observations[id_], id_)
             self.actions[id_] = action
 
-    def step(self, display=False, sounds=False, debug=False):   
+    def step(self, display=False, sounds=False, debug=False, pace=True):   
         observations, rewards, terminated, truncated, info = self.env.step(self.actions)
 
         for script in self.scripts:
@@ -155,15 +161,17 @@ class RaiderEnvironmentWrapper():
             action = script.getAction(observations[id_], id_)
             self.actions[id_] = action
         
-        if self.mode == "god":
+        if self.mode == "god" and self.env.screen is not None:
             self.cameraControl()
 
         if display:
-            self.display(self.hover_player, sounds, debug)
+            self.display(self.hover_player, sounds, debug, pace)
         
         return observations, rewards, terminated, truncated, info
     
-    def display(self, player_id, sounds, debug):
+    def display(self, player_id, sounds, debug, pace=True):
+        self.env.render()
+        self.env.initializeDisplay()
         old_camera_scale = self.env.camera.scale
         old_camera_center = self.env.camera.frame_rect.center
 
@@ -202,11 +210,13 @@ class RaiderEnvironmentWrapper():
         self.env.screen.blit(text_surf, text_rect)
         pygame.display.flip()
 
-        self.framerate = int(1 / (time.time() - self.t))
-        if self.speedup:
-            self.env.clock.tick(60)
-        else:    
-            self.env.clock.tick(20)
+        self.framerate = int(1 / max(time.time() - self.t, 1e-6))
+        # pace=False leaves the timing to the caller
+        if pace:
+            if self.speedup:
+                self.env.clock.tick(60)
+            else:    
+                self.env.clock.tick(20)
         self.t = time.time()
 
         self.env.camera.scale = old_camera_scale
@@ -1,7 +1,5 @@
 # game_client.py
 import socket
-import pickle
-import struct
 import pygame
 import sys
 import time
@@ -16,7 +14,9 @@ os.environ['SDL_VIDEO_WINDOW_POS'] = '0,0'
 import raiders
 from env_utils import RaiderEnvironmentWrapper
 from static_displays import StaticDisplays
-MSG_LEN_STRUCT = struct.Struct("!I")
+from storm_overlay import StormOverlay
+import net_protocol
+from net_protocol import send_msg, recv_msg
 
 KEY_ALIASES = {
     # Arrows
@@ -59,28 +59,6 @@ def key_from_name(name: str):
         raise ValueError(f"Unknown key or button name: '{name}'")
     
 
-def send_msg(sock, obj):
-    data = pickle.dumps(obj)
-    sock.sendall(MSG_LEN_STRUCT.pack(len(data)) + data)
-
-
-def recv_msg(sock):
-    try:
-        header = sock.recv(MSG_LEN_STRUCT.size)
-        if not header:
-            return None
-        (length,) = MSG_LEN_STRUCT.unpack(header)
-        data = b""
-        while len(data) < length:
-            packet = sock.recv(length - len(data))
-            if not packet:
-                return None
-            data += packet
-        return pickle.loads(data)
-    except Exception:
-        return None
-    
-
 class InputBox:
     def __init__(self, x, y, w, h, text='', placeholder=''):
         self.rect = pygame.Rect(x, y, w, h)
@@ -126,12 +104,14 @@ class GameClient:
         self.team = team
         self.player_id = None
         self.hover_player = None
+        self.mirror = net_protocol.WorldMirror()
+        self.storm_overlay = StormOverlay()
         self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         self.sock.settimeout(5.0)
         self.sock.connect((server_ip, port))
         self.sock.settimeout(None)  # blocking for main loop
         # register with server
-        send_msg(self.sock, {'type': 'register', 'team': team})
+        send_msg(self.sock, net_protocol.encode_register(team))
 
         # Load controls from YAML
         self.config_path = "preferences.yaml"
@@ -265,6 +245,7 @@ class GameClient:
         if msg and msg.get("type") == "register_ack":
             self.player_id = msg["player_id"]
             print(f"[client] joined team {self.team} as player {self.player_id}")
+            send_msg(self.sock, net_protocol.encode_snapshot_request())
         else:
             print("[client] registration failed")
             return
@@ -301,6 +282,13 @@ class GameClient:
                     ids = msg.get('ids')
                     teams = msg.get('teams')
 
+                    info['objects'] = self.mirror.apply(msg)
+                    if info['objects'] is None:
+                        # missed the frame this delta builds on, start over from a keyframe
+                        self.mirror = net_protocol.WorldMirror()
+                        send_msg(self.sock, net_protocol.encode_snapshot_request())
+                        continue
+
                     if info["healths"][self.player_id] > 0:
                         self.hover_player = self.player_id
                     else:
@@ -340,7 +328,7 @@ class GameClient:
                         players = []
                         for obj in objects:
                             dx, dy = obj[1]-player_pos[0], obj[2]-player_pos[1]
-                            if math.dist((obj[1],obj[2]), (x0+300,y0+300)) > 550: 
+                            if math.dist((obj[1],obj[2]), (x0+300,y0+300)) > net_protocol.VIEW_RADIUS: 
                                 continue
                             screen_pos = dx+relative_pos[0], dy+600-relative_pos[1]
                             raiders.StaticDisplays.display(frame_surf, screen_pos, obj)
@@ -365,10 +353,7 @@ class GameClient:
 
                         map_size = msg["map_size"]
                         center = relative_pos[0] + map_size[0]//2 - px, (600-relative_pos[1]) + map_size[1]//2 - py
-                        mask = pygame.Surface(size, pygame.SRCALPHA)
-                        mask.fill((255, 0, 0, 120))  # semi-transparent red
-                        pygame.draw.circle(mask, (0, 0, 0, 0), center, int(info["stormsize"]))  # transparent center
-                        frame_surf.blit(mask, (0, 0))
+                        self.storm_overlay.draw(frame_surf, center, int(info["stormsize"]))
 
 
                     except Exception as e:
@@ -458,10 +443,9 @@ class GameClient:
 
                     # build action from local input and send to server
                     action = self.build_action_from_input(player_angle, relative_pos)
-                    msg = {'type': 'action', 'player_id': self.player_id, 'action': action}
+                    new_name = None
                     if info["names"][self.player_id] != self.name_box.text:
                         new_name = self.name_box.text
-                        msg["name"] = new_name
                         if self.config["name"] != new_name:
                             self.config["name"] = new_name
                             try:
@@ -470,7 +454,7 @@ class GameClient:
                                 print(f"[client] Saved new player name: {new_name}")
                             except Exception as e:
                                 print(f"[client] Failed to save name: {e}")
-                    send_msg(self.sock, msg)
+                    send_msg(self.sock, net_protocol.encode_action(self.player_id, action, self.mirror.seq, abs(self.hover_player), new_name))
 
 
                     # lightweight tick limit to avoid burning 100% CPU
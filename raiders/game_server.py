@@ -1,134 +1,132 @@
 # game_server.py
-import socket
-import threading
-import pickle
-import struct
-import sys
-import pygame
 import time
+import math
+import asyncio
+import argparse
+import threading
+import concurrent.futures
+import itertools
+import collections
 import traceback
 
+import pygame
+
 import raiders
 import env_utils
 from env_utils import RaiderEnvironmentWrapper
+import net_protocol
+
+
+class ClientConnection:
+    """
+    One connected client: its player, what it acked and was sent, and a bounded send queue drained
+    by its own task, so a slow connection only holds up itself and never the game loop. At most
+    max_pending messages wait, when the client falls behind the oldest are dropped (frames are
+    diffed against what the client acked, so skipping some is safe).
+    """
+
+    def __init__(self, reader, writer, player_id, team, max_pending=4):
+        self.reader = reader
+        self.writer = writer
+        self.player_id = player_id
+        self.team = team
+        self.view_id = player_id
+        self.action = None  # latest action and name, applied by the match at its next tick
+        self.name = None
+        self.ack = 0
+        self.keyframe = 0
+        self.interest = {}  # frame seq -> ids of the objects sent in it
+        self.queue = collections.deque(maxlen=max_pending)
+        self.ready = asyncio.Event()
+        self.dropped = 0
+        self.closing = False
+        self.task = asyncio.create_task(self.write_loop())
+
+    def put(self, data):
+        if len(self.queue) == self.queue.maxlen:
+            self.dropped += 1
+        self.queue.append(data)
+        self.ready.set()
+
+    async def write_loop(self):
+        try:
+            while self.queue or not self.closing:
+                await self.ready.wait()
+                self.ready.clear()
+                while self.queue:
+                    self.writer.write(net_protocol.pack_msg(self.queue.popleft()))
+                    await self.writer.drain()
+        except (ConnectionError, OSError):
+            # the read side notices the dead connection and cleans up
+            pass
 
+    async def close(self, timeout=1.0):
+        """Stop once the queued messages are sent."""
+        self.closing = True
+        self.ready.set()
+        try:
+            await asyncio.wait_for(self.task, timeout)
+        except asyncio.TimeoutError:
+            pass
+        self.writer.close()
+
+
+class Match:
+    """
+    One game and the clients playing it. tick() and the add/remove methods may run on a worker
+    thread, they hold the match lock while touching the env, network handlers only leave actions
+    on the ClientConnection for the next tick to pick up.
+
+    displayed=True renders the game in the pygame window with the camera and keyboard controls.
+    """
+
+    def __init__(self, match_id, agent_scripts=(), displayed=False, tick_rate=20, max_players=8):
+        self.match_id = match_id
+        self.displayed = displayed
+        self.tick_rate = tick_rate
+        self.max_players = max_players
+        self.env = RaiderEnvironmentWrapper(mode="god", render_mode="human" if displayed else None)
+        self.env.loadAgentScripts(agent_scripts)
+        self.lock = threading.Lock()
+        self.clients = {}  # player_id -> ClientConnection
+        self.joining = 0  # clients registered but not added yet
+        self.history = net_protocol.SnapshotHistory()
+        self.net_ids = {}  # object -> id it is sent under
+        self.next_net_id = 1
+        self.observations = {}
+        self.next_tick = None
+        self.overruns = 0
+        self.tick_time = 0.0  # moving average of how long tick() takes, in seconds
+        self.running = True
+        self.reset_match()
 
-MSG_LEN_STRUCT = struct.Struct("!I")  # 4-byte unsigned int length prefix
-
-
-def send_msg(conn, obj):
-    """Send a length-prefixed pickled object."""
-    data = pickle.dumps(obj)
-    conn.sendall(MSG_LEN_STRUCT.pack(len(data)) + data)
-
-
-def recv_msg(conn):
-    """Receive a single length-prefixed pickled object. Returns None on error/closed."""
-    try:
-        header = conn.recv(MSG_LEN_STRUCT.size)
-        if not header:
-            return None
-        (length,) = MSG_LEN_STRUCT.unpack(header)
-        data = b""
-        while len(data) < length:
-            packet = conn.recv(length - len(data))
-            if not packet:
-                return None
-            data += packet
-        return pickle.loads(data)
-    except Exception:
-        return None
-
-
-class GameServer:
-    def __init__(self, host='0.0.0.0', port=12345):
-        pygame.init()
-        self.host = host
-        self.port = port
-
-        # create environment wrapper in "god" mode as requested
-        self.env = RaiderEnvironmentWrapper(mode="god")
+    def has_room(self):
+        return self.running and len(self.clients) + self.joining < self.max_players
 
-        # network
-        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        self.sock.settimeout(1.0)
-        self.sock.bind((host, port))
-        self.sock.listen()
+    def reset_match(self):
+        self.env.reset()
+        self.end_buffer = 5*self.tick_rate
+        self.done = False
 
-        # bookkeeping
-        self.pending_new_players = []
-        self.pending_remove_players = []
-        self.clients = {}  # conn -> {'player_id': int, 'thread': Thread}
-        self.player_conn = {}  # player_id -> conn
-        self.running = True
-        self.lock = threading.Lock()  # protects clients/player_conn
-        self.env_lock = threading.Lock()
+    def add_player(self, team):
+        with self.lock:
+            return self.env.addAgent(team=team)
 
-    def accept_loop(self):
-        print(f"[server] listening on {self.host}:{self.port}")
-        while self.running:
-            try:
-                conn, addr = self.sock.accept()
-                print(f"[server] connection from {addr}")
-                # For registration: expect a register message first
-                reg = recv_msg(conn)
-                if not reg or not isinstance(reg, dict) or reg.get("type") != "register":
-                    print("[server] invalid or no registration; closing connection")
-                    conn.close()
-                    continue
-                team = reg.get("team")
+    def remove_player(self, player_id):
+        with self.lock:
+            if player_id in self.env.active_ids:
+                self.env.removeAgent(player_id)
 
-                with self.lock:
-                    self.pending_new_players.append((conn, team))
-                print(f"[server] queued player for team '{team}'")
-            except socket.timeout:
-                continue
-            except Exception as e:
-                print(f"[server] accept error: {e}")
+    def apply_inputs(self):
+        for player_id, client in list(self.clients.items()):
+            player = self.env.env.players.get(player_id)
+            if player is None:
                 continue
-
-    def client_recv_loop(self, conn):
-        """Receive messages (actions) from a client and update env.actions accordingly."""
-        try:
-            while self.running:
-                msg = recv_msg(conn)
-                if msg is None:
-                    break
-                # Expect messages of form {'type': 'action', 'player_id': int, 'action': [...]}
-                if not isinstance(msg, dict):
-                    continue
-                if msg.get('type') == 'action':
-                    player_id = msg.get('player_id')
-                    action = msg.get('action')
-                    if player_id is None or action is None:
-                        continue
-                    action = action[:-1] + (env_utils.convAngleToAction(self.env.env.players[player_id].angle, action[-1]),)
-                    # validate range
-                    with self.lock:
-                        if player_id in self.env.actions:
-                            self.env.actions[player_id] = action
-                        else:
-                            print("player id not found")
-                    
-                    if "name" in msg:
-                        self.env.env.players[player_id].name = msg["name"]
-                # ignore other message types
-        except Exception as e:
-            print(f"[server] client_recv_loop error: {e}")
-        finally:
-            # cleanup connection
-            with self.lock:
-                info = self.clients.pop(conn, None)
-                if info:
-                    pid = info.get('player_id')
-                    self.player_conn.pop(pid, None)
-            try:
-                conn.close()
-            except:
-                pass
-            print("[server] client disconnected")
-            self.pending_remove_players.append(pid)
-            
+            if client.action is not None:
+                action, client.action = client.action, None
+                self.env.actions[player_id] = action[:-1] + (env_utils.convAngleToAction(player.angle, action[-1]),)
+            if client.name is not None:
+                player.name, client.name = client.name, None
 
     def process_object(self, obj):
         '''
@@ -137,7 +135,7 @@ class GameServer:
         info = (0, 0, 0, 0, 0, 0, 0, 0, 0)
         match type(obj):
             case raiders.Player:
-                info = (-1, obj.pos[0], obj.pos[1], obj.health, obj.angle, obj.hit, *obj.color, obj.active, obj.attack_tick, obj.frames, obj.id_, obj.kills)
+                info = (-1, obj.pos[0], obj.pos[1], obj.health, obj.angle, obj.hit, *obj.color, obj.active, obj.attack_tick, tuple(obj.frames), obj.id_, obj.kills)
             case raiders.Heal:
                 info = (0, obj.pos[0], obj.pos[1], 0, 0, 0, 0, 0, 0)
             case raiders.Arrow:
@@ -170,12 +168,28 @@ class GameServer:
         
         return info
 
-    def broadcast_frame(self, frame_surf):
-        """Encode a pygame Surface as raw RGB and broadcast to all clients as a frame message."""
-        # Convert surface to RGB raw bytes
+    def interest_set(self, client, size):
+        """Ids of the objects within the client's view, found through the env grid."""
+        env = self.env.env
+        player = env.players.get(client.view_id, env.players.get(client.player_id))
+        if player is None:
+            return set(self.history.states[self.history.seq])
+        center = net_protocol.view_center(player.pos, size)
+        cells = math.ceil(net_protocol.VIEW_RADIUS / env.grid.gridsize)
+        # effects and dead players are not in the grid
+        nearby = itertools.chain(env.grid.iterNearbyObjects(center, size=cells, dynamic=True), env.effects, env.getPlayers())
+        ids = set()
+        for obj in nearby:
+            net_id = self.net_ids.get(obj)
+            if net_id is not None and math.dist(obj.pos, center) <= net_protocol.VIEW_RADIUS:
+                ids.add(net_id)
+        return ids
+
+    def broadcast_frame(self):
+        """Encode the game state as a frame message per client, returns [(client, data)]."""
+        outgoing = []
         try:
-            # ensure the frame is the surface the env used for display (screen)
-            w, h = frame_surf.get_size()
+            w, h = self.env.env.map_size
 
             objects = [self.env.env.base]
             for obj in self.env.env.effects:
@@ -197,182 +211,361 @@ class GameServer:
                     continue
                 objects.append(obj)
             
-            for i in range(len(objects)):
-                objects[i] = self.process_object(objects[i])
-
-            msg = {
-                'type': 'frame',
-                #'img_bytes': img_bytes,
-                'map_size': self.env.env.map_size,
-                'size': (w, h),
-                'timestamp': time.time(),
-                'ids': self.env.getActiveIDs(),
-                'teams': self.env.env.getTeamCounts(),
-                'info': {
-                    'names': {id_:obs.self.name for id_, obs in self.observations.items()},
-                    'healths': {id_:obs.self.health for id_, obs in self.observations.items()},
-                    'angles': {id_:obs.self.angle for id_, obs in self.observations.items()},
-                    'positions': {id_:obs.self.position for id_, obs in self.observations.items()},
-                    'food': {id_:obs.self.food for id_, obs in self.observations.items()},
-                    'wood': {id_:obs.self.wood for id_, obs in self.observations.items()},
-                    'stone': {id_:obs.self.stone for id_, obs in self.observations.items()},
-                    'objects': objects,
-                    'sounds': self.env.env.sounds,
-                    'stormsize': self.env.env.storm_size,
-                }
-            }
-
-            with self.lock:
-                conns = list(self.clients.keys())
-
-            for conn in conns:
-                try:
-                    send_msg(conn, msg)
-                except Exception:
-                    # client may have dropped; client_recv_loop will clean up
-                    pass
+            # objects keep their id for as long as they exist, the state is what clients diff against
+            net_ids = {}
+            state = {}
+            for obj in objects:
+                net_id = self.net_ids.get(obj)
+                if net_id is None:
+                    net_id = self.next_net_id
+                    self.next_net_id += 1
+                net_ids[obj] = net_id
+                state[net_id] = self.process_object(obj)
+            self.net_ids = net_ids
+            seq = self.history.push(state)
+
+            players = []
+            names = []
+            for id_, obs in self.observations.items():
+                me = obs["self"]
+                players.append((id_, me["health"], me["angle"], *me["position"], me["food"], me["wood"], me["stone"]))
+                names.append(me["name"])
+
+            shared = net_protocol.encode_frame_shared(
+                seq=seq,
+                map_size=self.env.env.map_size,
+                size=(w, h),
+                timestamp=time.time(),
+                storm_size=self.env.env.storm_size,
+                ids=self.env.getActiveIDs(),
+                teams=self.env.env.getTeamCounts(),
+                players=players,
+                names=names,
+                sounds=self.env.env.sounds,
+            )
+
+            for client in list(self.clients.values()):
+                baseline = self.history.baseline(client.ack, client.keyframe)
+                if baseline == 0:
+                    client.keyframe = seq
+                # what this client was sent, per frame, to diff its next frames against
+                interest = client.interest
+                interest[seq] = self.interest_set(client, (w, h))
+                interest.pop(seq - net_protocol.HISTORY, None)
+                object_ids, objects, removed = self.history.delta(baseline, interest[seq], interest.get(baseline))
+                outgoing.append((client, shared + net_protocol.encode_frame_objects(baseline, object_ids, objects, removed)))
         except Exception as e:
             print(f"[server] frame broadcast error: {e}")
             traceback.print_exc()
+        return outgoing
 
-    def game_loop(self):
-        """Main game loop: step the environment, display (which updates env.screen), broadcast the frame, handle quit."""
-        print("[server] entering game loop")
+    def handle_keys(self):
+        keys = pygame.key.get_pressed()
+        if keys[pygame.K_r]:
+            self.reset_match()
+        
+        if keys[pygame.K_u]:
+            if not any(isinstance(script, env_utils.AgentScripts.BasicAgent) and script.__team__=="defender" for script in self.env.scripts):
+                self.env.addScript(env_utils.AgentScripts.BasicAgent)
+            for script in self.env.scripts:
+                if isinstance(script, env_utils.AgentScripts.BasicAgent) and script.__team__=="defender":
+                    print(type(script))
+                    self.env.removeAgent(script=script)
+                    break
+        if keys[pygame.K_i]:
+            if not any(isinstance(script, env_utils.AgentScripts.BasicAgent) and script.__team__=="raider" for script in self.env.scripts):
+                self.env.addScript(env_utils.AgentScripts.BasicAgent)
+            for script in self.env.scripts:
+                if isinstance(script, env_utils.AgentScripts.BasicAgent) and script.__team__=="raider":
+                    print(type(script))
+                    self.env.removeAgent(script=script)
+                    break
+        if keys[pygame.K_o]:
+            if not any(isinstance(script, env_utils.AgentScripts.BasicAgent) and script.__team__=="defender" for script in self.env.scripts):
+                self.env.addScript(env_utils.AgentScripts.BasicAgent)
+            for script in self.env.scripts:
+                if isinstance(script, env_utils.AgentScripts.BasicAgent) and script.__team__=="defender":
+                    print(type(script))
+                    self.env.addAgent(script=script)
+                    break
+        if keys[pygame.K_p]:
+            if not any(isinstance(script, env_utils.AgentScripts.BasicAgent) and script.__team__=="raider" for script in self.env.scripts):
+                self.env.addScript(env_utils.AgentScripts.BasicAgent)
+            for script in self.env.scripts:
+                if isinstance(script, env_utils.AgentScripts.BasicAgent) and script.__team__=="raider":
+                    print(type(script))
+                    self.env.addAgent(script=script)
+                    break
+
+        # handle pygame events (quit)
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                print("[server] pygame QUIT received")
+                self.running = False
+
+    def tick(self):
+        """Step the environment, display it if shown, and encode the frame for every client."""
+        start = time.perf_counter()
+        with self.lock:
+            if self.displayed:
+                self.handle_keys()
+            self.apply_inputs()
+
+            # the window is drawn without its own frame limiter, the scheduler sets the pace
+            observations, rewards, terminated, truncated, info = self.env.step(display=self.displayed, pace=False)
+            self.observations = observations
+            outgoing = self.broadcast_frame()
+
+            if terminated:
+                self.done = True
+            if self.done:
+                self.end_buffer -= 1
+            if self.end_buffer == 0:
+                self.reset_match()
+        self.tick_time += 0.1 * (time.perf_counter() - start - self.tick_time)
+        return outgoing
+
+
+class GameServer:
+    """
+    Lobby hosting up to max_matches independent matches for network clients on one asyncio event
+    loop. Registering clients join the first match with room, a new match is started when all are
+    full, and matches close when their last client leaves. Clients are read and written without
+    blocking.
+
+    Every match runs on its own fixed timestep of tick_rate steps per second, its ticks are run on a
+    worker thread so the event loop stays free for the network. When a tick overruns the following
+    waits are shortened to catch up, after falling more than max_catchup steps behind the match's
+    schedule restarts from now instead of bursting.
+
+    The games are pure Python, so ticks of different matches take turns on the GIL and all matches
+    of a process share one core: the tick time of each grows with the number of matches. A new
+    match is only started while the matches' summed tick time stays below max_load of the tick
+    period (and there are fewer than max_matches), past that registering clients are turned away.
+    Run several server processes on different ports to use more cores.
+
+    headless=False shows match 0 in a pygame window (kept open even without clients), its ticks
+    run on the main thread since pygame windows belong to it. make_agent_scripts() returns the
+    (script, count, team) list for every new match.
+    """
+
+    def __init__(self, host='0.0.0.0', port=12345, headless=False, tick_rate=20, max_catchup=5,
+                 max_matches=8, players_per_match=8, max_load=0.8, workers=1, make_agent_scripts=None):
+        pygame.init()
+        self.host = host
+        self.port = port
+        self.headless = headless
+        self.tick_rate = tick_rate
+        self.max_catchup = max_catchup
+        self.max_matches = max_matches
+        self.players_per_match = players_per_match
+        self.max_load = max_load
+        self.make_agent_scripts = make_agent_scripts or (lambda: [])
+        # more threads than one do not step matches any faster, see the class docstring
+        self.pool = concurrent.futures.ThreadPoolExecutor(workers)
+        self.matches = {}  # match_id -> Match
+        self.match_tasks = {}
+        self.client_tasks = set()
+        self.starting = None  # task creating the next match
+        self.next_match_id = 0
+        self.running = True
+
+    async def create_match(self, displayed=False):
+        match_id = self.next_match_id
+        self.next_match_id += 1
+        args = (match_id, self.make_agent_scripts(), displayed, self.tick_rate, self.players_per_match)
         try:
-            buffer = 5*20
-            done = False
-            while self.running:
-                # Use env.step(display=True) so the env wrapper updates the display surfaces and handles camera controls
-                keys = pygame.key.get_pressed()
-                if keys[pygame.K_r]:
-                    self.env.reset()
-                    buffer = 5*20
-                    done = False
-                
-                if keys[pygame.K_u]:
-                    if not any(isinstance(script, env_utils.AgentScripts.BasicAgent) and script.__team__=="defender" for script in self.env.scripts):
-                        self.env.addScript(env_utils.AgentScripts.BasicAgent)
-                    for script in self.env.scripts:
-                        if isinstance(script, env_utils.AgentScripts.BasicAgent) and script.__team__=="defender":
-                            print(type(script))
-                            self.env.removeAgent(script=script)
-                            break
-                if keys[pygame.K_i]:
-                    if not any(isinstance(script, env_utils.AgentScripts.BasicAgent) and script.__team__=="raider" for script in self.env.scripts):
-                        self.env.addScript(env_utils.AgentScripts.BasicAgent)
-                    for script in self.env.scripts:
-                        if isinstance(script, env_utils.AgentScripts.BasicAgent) and script.__team__=="raider":
-                            print(type(script))
-                            self.env.removeAgent(script=script)
-                            break
-                if keys[pygame.K_o]:
-                    if not any(isinstance(script, env_utils.AgentScripts.BasicAgent) and script.__team__=="defender" for script in self.env.scripts):
-                        self.env.addScript(env_utils.AgentScripts.BasicAgent)
-                    for script in self.env.scripts:
-                        if isinstance(script, env_utils.AgentScripts.BasicAgent) and script.__team__=="defender":
-                            print(type(script))
-                            self.env.addAgent(script=script)
-                            break
-                if keys[pygame.K_p]:
-                    if not any(isinstance(script, env_utils.AgentScripts.BasicAgent) and script.__team__=="raider" for script in self.env.scripts):
-                        self.env.addScript(env_utils.AgentScripts.BasicAgent)
-                    for script in self.env.scripts:
-                        if isinstance(script, env_utils.AgentScripts.BasicAgent) and script.__team__=="raider":
-                            print(type(script))
-                            self.env.addAgent(script=script)
-                            break
-
-
-                # Handle new player joins safely
-                with self.lock:
-                    while self.pending_new_players:
-                        conn, team = self.pending_new_players.pop(0)
-                        with self.env_lock:
-                            player_id = self.env.addAgent(team=team)
-                        print(f"[server] created player {player_id} for team '{team}'")
-                        send_msg(conn, {"type": "register_ack", "player_id": player_id, "team": team})
-
-                        # set up connection bookkeeping
-                        self.clients[conn] = {'player_id': player_id, 'addr': conn.getpeername(), 'team': team}
-                        self.player_conn[player_id] = conn
-                        t = threading.Thread(target=self.client_recv_loop, args=(conn,), daemon=True)
-                        t.start()
-                        self.clients[conn]['thread'] = t
-                    while self.pending_remove_players:
-                        pid = self.pending_remove_players.pop()
-                        with self.env_lock:
-                            self.env.removeAgent(pid)
-                            print(f"[server] removed player {pid}")
-
-                observations, rewards, terminated, truncated, info = self.env.step(display=True)
-                self.observations = observations
-
-                # grab the screen buffer from the environment's screen surface
-                frame = self.env.env.surface
-
-                # broadcast the frame to all clients
-                self.broadcast_frame(frame)
-
-                # handle pygame events (quit)
-                for event in pygame.event.get():
-                    if event.type == pygame.QUIT:
-                        print("[server] pygame QUIT received")
-                        self.running = False
-
-                if terminated:
-                    done = True
-
-                if done:
-                    buffer -= 1
-                
-                if buffer == 0:
-                    self.env.reset()
-                    buffer = 5*20
-                    done = False
+            if displayed:
+                match = Match(*args)
+            else:
+                # building the environment takes a while, keep the event loop serving meanwhile
+                match = await asyncio.get_running_loop().run_in_executor(self.pool, Match, *args)
+        finally:
+            self.starting = None
+        self.matches[match_id] = match
+        self.match_tasks[match_id] = asyncio.create_task(self.run_match(match))
+        print(f"[server] started match {match_id}")
+        return match
+
+    def load(self):
+        """Fraction of the tick period the running matches take to tick, together."""
+        return sum(match.tick_time for match in self.matches.values()) * self.tick_rate
+
+    async def find_match(self):
+        """First match with room, starting a new one if needed, None when all are full."""
+        while True:
+            for match in self.matches.values():
+                if match.has_room():
+                    return match
+            if self.starting is None:
+                if len(self.matches) >= self.max_matches or self.load() >= self.max_load:
+                    return None
+                self.starting = asyncio.create_task(self.create_match())
+            # clients registering at the same time wait for the same new match
+            await asyncio.shield(self.starting)
+
+    async def handle_client(self, reader, writer):
+        task = asyncio.current_task()
+        self.client_tasks.add(task)
+        try:
+            await self.serve_client(reader, writer)
+        except asyncio.CancelledError:
+            # cancelled by shutdown(), asyncio reports connection tasks that end cancelled so end normally
+            writer.close()
+        finally:
+            self.client_tasks.discard(task)
 
-        except KeyboardInterrupt:
-            print("[server] KeyboardInterrupt")
-            self.running = False
+    async def serve_client(self, reader, writer):
+        loop = asyncio.get_running_loop()
+        addr = writer.get_extra_info("peername")
+        print(f"[server] connection from {addr}")
+        # For registration: expect a register message first
+        try:
+            reg = await asyncio.wait_for(net_protocol.read_msg(reader), 10)
+        except asyncio.TimeoutError:
+            reg = None
+        if not reg or reg.get("type") != "register":
+            print("[server] invalid or no registration; closing connection")
+            writer.close()
+            return
+        match = await self.find_match()
+        if match is None:
+            print("[server] all matches are full; closing connection")
+            writer.write(net_protocol.pack_msg(net_protocol.encode_shutdown()))
+            writer.close()
+            return
+
+        team = reg.get("team")
+        match.joining += 1
+        try:
+            player_id = await loop.run_in_executor(self.pool, match.add_player, team)
         finally:
-            self.shutdown()
+            match.joining -= 1
+        print(f"[server] created player {player_id} for team '{team}' in match {match.match_id}")
+        writer.write(net_protocol.pack_msg(net_protocol.encode_register_ack(player_id, team)))
+        client = ClientConnection(reader, writer, player_id, team)
+        match.clients[player_id] = client
 
-    def shutdown(self):
+        try:
+            await self.read_loop(client)
+        except Exception as e:
+            print(f"[server] read_loop error: {e}")
+        finally:
+            match.clients.pop(player_id, None)
+            await client.close(timeout=0)
+            await loop.run_in_executor(self.pool, match.remove_player, player_id)
+            print(f"[server] removed player {player_id} from match {match.match_id}")
+            if not match.clients and not match.displayed:
+                match.running = False
+
+    async def read_loop(self, client):
+        """Receive messages (actions) from a client and keep them for the match's next tick."""
+        while self.running:
+            msg = await net_protocol.read_msg(client.reader)
+            if msg is None:
+                break
+            if msg['type'] == 'action':
+                # a client only controls its own player, whatever id it sends
+                client.action = msg['action']
+                if "name" in msg:
+                    client.name = msg["name"]
+                client.ack = msg['ack']
+                client.view_id = msg['view_id']
+            elif msg['type'] == 'snapshot_request':
+                client.ack = 0
+            # ignore other message types
+
+    async def run_match(self, match):
+        """Run match.tick() on a fixed timestep until the match or the server stops."""
+        loop = asyncio.get_running_loop()
+        step = 1 / self.tick_rate
+        next_tick = loop.time()
+        try:
+            while self.running and match.running:
+                if match.displayed:
+                    outgoing = match.tick()
+                else:
+                    outgoing = await loop.run_in_executor(self.pool, match.tick)
+                for client, data in outgoing:
+                    client.put(data)
+                # closing the window stops the server, other matches only stop themselves
+                if not match.running and match.displayed:
+                    self.running = False
+                next_tick += step
+                delay = next_tick - loop.time()
+                if delay < -self.max_catchup*step:
+                    # too far behind to catch up, drop the missed ticks
+                    match.overruns += 1
+                    next_tick = loop.time()
+                    delay = 0
+                # always yield so clients are served even when behind
+                await asyncio.sleep(max(0, delay))
+        except Exception as e:
+            print(f"[server] match {match.match_id} error: {e}")
+            traceback.print_exc()
+        finally:
+            self.matches.pop(match.match_id, None)
+            self.match_tasks.pop(match.match_id, None)
+            for client in list(match.clients.values()):
+                client.put(net_protocol.encode_shutdown())
+                await client.close()
+            print(f"[server] closed match {match.match_id}")
+
+    async def serve(self):
+        server = await asyncio.start_server(self.handle_client, self.host, self.port)
+        print(f"[server] listening on {self.host}:{self.port}")
+        if not self.headless:
+            await self.create_match(displayed=True)
+        try:
+            while self.running:
+                await asyncio.sleep(0.2)
+        finally:
+            server.close()
+            await self.shutdown()
+
+    async def shutdown(self):
         print("[server] shutting down")
         self.running = False
-        with self.lock:
-            conns = list(self.clients.keys())
-        for conn in conns:
-            try:
-                send_msg(conn, {'type': 'server_shutdown'})
-            except:
-                pass
-            try:
-                conn.shutdown(socket.SHUT_RDWR)
-                conn.close()
-            except:
-                pass
-        try:
-            self.sock.close()
-        except:
-            pass
+        # match loops send their clients the shutdown message on the way out
+        await asyncio.gather(*self.match_tasks.values(), return_exceptions=True)
+        # then stop the connection handlers, they still need the pool to remove their players
+        tasks = list(self.client_tasks)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self.pool.shutdown(wait=True)
         try:
             pygame.quit()
         except:
             pass
         print("[server] stopped")
 
+    def run(self):
+        try:
+            asyncio.run(self.serve())
+        except KeyboardInterrupt:
+            print("[server] KeyboardInterrupt")
+
 
-if __name__ == "__main__":
-    # If you want to include agents/scripts, construct them and pass into GameServer(..., agent_scripts=[...])
-    # For now, we pass an empty agent_scripts list so server still runs and uses only player actions and default agents.
-    myip = "127.0.0.1"
-    agent_scripts = [
-        (env_utils.AgentScripts.MatthewAgent(), 5, "defender"),
+def default_agent_scripts():
+    return [
+        (env_utils.AgentScripts.BasicAgent(), 5, "defender"),
         (env_utils.AgentScripts.BasicAgent(), 10, "raider")
     ]
-    server = GameServer(host=myip, port=9999)
-    server.env.loadAgentScripts(agent_scripts)
-    server.env.reset()
-    accept_thread = threading.Thread(target=server.accept_loop, daemon=True)
-    accept_thread.start()
-    server.game_loop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Host Raiders matches for game_client.py")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9999)
+    parser.add_argument("--headless", action="store_true", help="run without a pygame window")
+    parser.add_argument("--tick-rate", type=int, default=20)
+    parser.add_argument("--max-matches", type=int, default=8)
+    parser.add_argument("--players-per-match", type=int, default=8)
+    parser.add_argument("--max-load", type=float, default=0.8, help="share of the tick period all matches may take before no new ones are started")
+    args = parser.parse_args()
+
+    server = GameServer(host=args.host, port=args.port, headless=args.headless, tick_rate=args.tick_rate,
+                        max_matches=args.max_matches, players_per_match=args.players_per_match,
+                        max_load=args.max_load, make_agent_scripts=default_agent_scripts)
+    server.run()
@@ -0,0 +1,352 @@
+'''
+Binary messages exchanged by game_server and game_client.
+
+Every message is length prefixed (MSG_LEN_STRUCT) and starts with HEADER: protocol version and
+message type. Fixed fields are packed with struct, per object/player/sound tables are NumPy
+record arrays sent as raw little endian bytes, each preceded by a u32 row count. Strings are
+u8 length prefixed utf-8.
+
+    REGISTER:          team
+    REGISTER_ACK:      player id (u16), team
+    ACTION:            player id (u16), ax, ay, active, attack (u8), target angle (f32),
+                       acked frame (u32), viewed player id (u16), has name (u8), [name]
+    FRAME:             FRAME_STRUCT, ids (u16 table), PLAYER_DTYPE table, one name per player row,
+                       SOUND_DTYPE table, then the part specific to the client: baseline (u32),
+                       object ids (u32 table), OBJECT_DTYPE table, PLAYER_EXTRA_DTYPE table (one row
+                       per player object, in order), removed object ids (u32 table)
+    SHUTDOWN:          nothing
+    SNAPSHOT_REQUEST:  nothing
+
+Frames decode into the same nested dict the client always used, objects are the tuples of
+process_object: (type, x, y, health, angle, hit, r, g, b) plus, for players,
+(active, attack_tick, frames, id, kills).
+
+Objects are delta compressed. Every frame has a sequence number and a baseline, the last frame the
+client acknowledged in its actions, and only carries the objects created or changed since the
+baseline plus the ids of the removed ones. Baseline 0 marks a keyframe with every object, sent to
+new clients, clients that ask for one (SNAPSHOT_REQUEST), clients whose ack fell out of the
+server's history, and every KEYFRAME_INTERVAL frames. WorldMirror rebuilds the full object list on
+the client.
+
+Each client is only sent the objects within VIEW_RADIUS of its view, the VIEW_SIZE square around the
+player it watches (itself, or whoever it spectates), clamped to the map. Objects leaving the view
+count as removed for that client, objects entering it as created.
+'''
+
+import struct
+import asyncio
+
+import numpy as np
+
+
+PROTOCOL_VERSION = 1
+
+REGISTER, REGISTER_ACK, ACTION, FRAME, SHUTDOWN, SNAPSHOT_REQUEST = range(1, 7)
+MESSAGE_NAMES = {
+    REGISTER: "register",
+    REGISTER_ACK: "register_ack",
+    ACTION: "action",
+    FRAME: "frame",
+    SHUTDOWN: "server_shutdown",
+    SNAPSHOT_REQUEST: "snapshot_request",
+}
+
+# frames the server keeps to diff against, and how often a client gets a keyframe regardless
+HISTORY = 64
+KEYFRAME_INTERVAL = 200
+
+# what a client draws around the player it watches
+VIEW_SIZE = 600
+VIEW_RADIUS = 550
+
+# draw order of object types, objects of the same layer are drawn in id order
+DRAW_LAYERS = {13: 0, 0: 1, -1: 3, 8: 4}
+
+MSG_LEN_STRUCT = struct.Struct("!I")
+HEADER = struct.Struct("<BB")
+COUNT = struct.Struct("<I")
+U8 = struct.Struct("<B")
+U16 = struct.Struct("<H")
+ACTION_STRUCT = struct.Struct("<H4BfIH")
+# sequence, map w, h, frame w, h, timestamp, storm size, defenders, raiders
+FRAME_STRUCT = struct.Struct("<I4Hdf2H")
+
+OBJECT_DTYPE = np.dtype([
+    ("type", "<i1"), ("x", "<f4"), ("y", "<f4"), ("health", "<f4"), ("angle", "<f4"),
+    ("hit", "u1"), ("r", "u1"), ("g", "u1"), ("b", "u1"),
+])
+PLAYER_EXTRA_DTYPE = np.dtype([
+    ("active", "u1"), ("attack_tick", "<i2"), ("frames", "<i2", (3,)), ("id", "<u2"), ("kills", "<u2"),
+])
+PLAYER_DTYPE = np.dtype([
+    ("id", "<u2"), ("health", "<f4"), ("angle", "<f4"), ("x", "<f4"), ("y", "<f4"),
+    ("food", "<f4"), ("wood", "<f4"), ("stone", "<f4"),
+])
+SOUND_DTYPE = np.dtype([("sound", "<u2"), ("x", "<f4"), ("y", "<f4"), ("scale", "<f4")])
+
+
+def view_center(pos, size):
+    # center of the VIEW_SIZE square around pos, kept inside a map of the given size
+    half = VIEW_SIZE / 2
+    x0 = max(0, min(int(pos[0] - half), size[0] - VIEW_SIZE))
+    y0 = max(0, min(int(pos[1] - half), size[1] - VIEW_SIZE))
+    return x0 + half, y0 + half
+
+
+def pack_msg(data):
+    return MSG_LEN_STRUCT.pack(len(data)) + data
+
+def send_msg(conn, data):
+    """Send one length-prefixed message."""
+    conn.sendall(pack_msg(data))
+
+def recv_exact(conn, length):
+    data = bytearray()
+    while len(data) < length:
+        packet = conn.recv(length - len(data))
+        if not packet:
+            return None
+        data += packet
+    return bytes(data)
+
+def recv_msg(conn):
+    """Receive one length-prefixed message and decode it. Returns None on error/closed."""
+    try:
+        header = recv_exact(conn, MSG_LEN_STRUCT.size)
+        if header is None:
+            return None
+        (length,) = MSG_LEN_STRUCT.unpack(header)
+        data = recv_exact(conn, length)
+        if data is None:
+            return None
+        return decode_message(data)
+    except (OSError, ValueError, struct.error):
+        return None
+
+async def read_msg(reader):
+    """recv_msg for an asyncio StreamReader."""
+    try:
+        header = await reader.readexactly(MSG_LEN_STRUCT.size)
+        (length,) = MSG_LEN_STRUCT.unpack(header)
+        return decode_message(await reader.readexactly(length))
+    except (asyncio.IncompleteReadError, OSError, ValueError, struct.error):
+        return None
+
+
+def pack_str(text):
+    data = text.encode("utf-8")[:255]
+    return U8.pack(len(data)) + data
+
+def unpack_str(data, pos):
+    (length,) = U8.unpack_from(data, pos)
+    pos += U8.size
+    return data[pos:pos+length].decode("utf-8", errors="replace"), pos+length
+
+def pack_table(array):
+    return COUNT.pack(len(array)) + array.tobytes()
+
+def unpack_table(data, pos, dtype):
+    (count,) = COUNT.unpack_from(data, pos)
+    pos += COUNT.size
+    array = np.frombuffer(data, dtype=dtype, count=count, offset=pos)
+    return array, pos + count*dtype.itemsize
+
+
+def encode_register(team):
+    return HEADER.pack(PROTOCOL_VERSION, REGISTER) + pack_str(team)
+
+def encode_register_ack(player_id, team):
+    return HEADER.pack(PROTOCOL_VERSION, REGISTER_ACK) + U16.pack(player_id) + pack_str(team)
+
+def encode_action(player_id, action, ack=0, view_id=None, name=None):
+    ax, ay, active, attack, angle = action
+    view_id = player_id if view_id is None else view_id
+    data = HEADER.pack(PROTOCOL_VERSION, ACTION) + ACTION_STRUCT.pack(player_id, ax, ay, active, int(attack), angle, ack, view_id)
+    if name is None:
+        return data + U8.pack(0)
+    return data + U8.pack(1) + pack_str(name)
+
+def encode_shutdown():
+    return HEADER.pack(PROTOCOL_VERSION, SHUTDOWN)
+
+def encode_snapshot_request():
+    return HEADER.pack(PROTOCOL_VERSION, SNAPSHOT_REQUEST)
+
+def encode_frame_shared(seq, map_size, size, timestamp, storm_size, ids, teams, players, names, sounds):
+    '''
+    Start of a frame message, the same for every client.
+    players: PLAYER_DTYPE rows with names in the same order
+    sounds: env.sounds
+    '''
+    parts = [
+        HEADER.pack(PROTOCOL_VERSION, FRAME),
+        FRAME_STRUCT.pack(seq, *map_size, *size, timestamp, storm_size, *teams),
+        pack_table(np.array(ids, dtype="<u2")),
+        pack_table(np.array(players, dtype=PLAYER_DTYPE)),
+    ]
+    parts.extend(pack_str(name) for name in names)
+    parts.append(pack_table(np.array(sounds, dtype=SOUND_DTYPE)))
+    return b"".join(parts)
+
+def encode_frame_objects(baseline, object_ids, objects, removed):
+    '''
+    Rest of a frame message, the objects as a delta for one client.
+    object_ids, objects: ids and process_object tuples of the objects created or changed since baseline
+    removed: ids of the objects removed since baseline
+    '''
+    base = [obj[:9] for obj in objects]
+    extras = [(obj[9], obj[10], tuple(obj[11]), obj[12], obj[13]) for obj in objects if obj[0] == -1]
+    return b"".join((
+        COUNT.pack(baseline),
+        pack_table(np.array(object_ids, dtype="<u4")),
+        pack_table(np.array(base, dtype=OBJECT_DTYPE)),
+        pack_table(np.array(extras, dtype=PLAYER_EXTRA_DTYPE)),
+        pack_table(np.array(removed, dtype="<u4")),
+    ))
+
+def encode_frame(baseline, object_ids, objects, removed, **shared):
+    return encode_frame_shared(**shared) + encode_frame_objects(baseline, object_ids, objects, removed)
+
+
+def decode_message(data):
+    version, mtype = HEADER.unpack_from(data, 0)
+    if version != PROTOCOL_VERSION:
+        raise ValueError(f"Unsupported protocol version: {version}")
+    if mtype not in MESSAGE_NAMES:
+        raise ValueError(f"Unknown message type: {mtype}")
+    pos = HEADER.size
+    msg = {"type": MESSAGE_NAMES[mtype]}
+
+    if mtype == REGISTER:
+        msg["team"], pos = unpack_str(data, pos)
+    elif mtype == REGISTER_ACK:
+        (msg["player_id"],) = U16.unpack_from(data, pos)
+        msg["team"], pos = unpack_str(data, pos+U16.size)
+    elif mtype == ACTION:
+        player_id, ax, ay, active, attack, angle, ack, view_id = ACTION_STRUCT.unpack_from(data, pos)
+        pos += ACTION_STRUCT.size
+        msg["player_id"] = player_id
+        msg["action"] = (ax, ay, active, attack, angle)
+        msg["ack"] = ack
+        msg["view_id"] = view_id
+        (has_name,) = U8.unpack_from(data, pos)
+        if has_name:
+            msg["name"], pos = unpack_str(data, pos+U8.size)
+    elif mtype == FRAME:
+        msg.update(decode_frame(data, pos))
+    return msg
+
+def decode_frame(data, pos):
+    seq, map_w, map_h, w, h, timestamp, storm_size, defenders, raiders = FRAME_STRUCT.unpack_from(data, pos)
+    pos += FRAME_STRUCT.size
+    ids, pos = unpack_table(data, pos, np.dtype("<u2"))
+    players, pos = unpack_table(data, pos, PLAYER_DTYPE)
+    names = []
+    for _ in range(len(players)):
+        name, pos = unpack_str(data, pos)
+        names.append(name)
+    sounds, pos = unpack_table(data, pos, SOUND_DTYPE)
+    (baseline,) = COUNT.unpack_from(data, pos)
+    object_ids, pos = unpack_table(data, pos+COUNT.size, np.dtype("<u4"))
+    base, pos = unpack_table(data, pos, OBJECT_DTYPE)
+    extras, pos = unpack_table(data, pos, PLAYER_EXTRA_DTYPE)
+    removed, pos = unpack_table(data, pos, np.dtype("<u4"))
+
+    objects = base.tolist()
+    extras = iter(extras.tolist())
+    for i, obj in enumerate(objects):
+        if obj[0] == -1:
+            active, attack_tick, frames, id_, kills = next(extras)
+            objects[i] = obj + (active, attack_tick, tuple(frames.tolist()), id_, kills)
+
+    player_ids = players["id"].tolist()
+    return {
+        "seq": seq,
+        "baseline": baseline,
+        "object_ids": object_ids.tolist(),
+        "removed": removed.tolist(),
+        "map_size": (map_w, map_h),
+        "size": (w, h),
+        "timestamp": timestamp,
+        "ids": tuple(ids.tolist()),
+        "teams": (defenders, raiders),
+        "info": {
+            "names": dict(zip(player_ids, names)),
+            "healths": dict(zip(player_ids, players["health"].tolist())),
+            "angles": dict(zip(player_ids, players["angle"].tolist())),
+            "positions": dict(zip(player_ids, zip(players["x"].tolist(), players["y"].tolist()))),
+            "food": dict(zip(player_ids, players["food"].tolist())),
+            "wood": dict(zip(player_ids, players["wood"].tolist())),
+            "stone": dict(zip(player_ids, players["stone"].tolist())),
+            "objects": objects,
+            "sounds": [tuple(sound) for sound in sounds.tolist()],
+            "stormsize": storm_size,
+        },
+    }
+
+
+class SnapshotHistory():
+    '''
+    Server side record of the last HISTORY frames, {object id: process_object tuple} per sequence
+    number, to diff the current frame against what each client acknowledged.
+    '''
+
+    def __init__(self, size=HISTORY):
+        self.size = size
+        self.states = {}
+        self.seq = 0
+
+    def push(self, state):
+        self.seq += 1
+        self.states[self.seq] = state
+        self.states.pop(self.seq - self.size, None)
+        return self.seq
+
+    def baseline(self, ack, last_keyframe):
+        # frame to diff the current one against for a client, 0 for a keyframe
+        if ack not in self.states or self.seq - last_keyframe >= KEYFRAME_INTERVAL:
+            return 0
+        return ack
+
+    def delta(self, baseline, interest=None, old_interest=None):
+        '''
+        (object ids, objects, removed ids) of the current frame relative to baseline. interest and
+        old_interest restrict the current and the baseline frame to the ids a client was sent
+        '''
+        state = self.states[self.seq]
+        ids = state if interest is None else interest
+        if not baseline:
+            return list(ids), [state[id_] for id_ in ids], []
+        old = self.states[baseline]
+        old_ids = old if old_interest is None else old_interest
+        changed = [id_ for id_ in ids if id_ not in old_ids or old.get(id_) != state[id_]]
+        removed = [id_ for id_ in old_ids if id_ not in ids]
+        return changed, [state[id_] for id_ in changed], removed
+
+
+class WorldMirror():
+    '''
+    Client side copy of the objects, rebuilt from delta frames. Keeps the frames newer than the
+    last baseline the server used, since the next delta can be relative to any of them.
+    '''
+
+    def __init__(self):
+        self.states = {}
+        self.seq = 0
+
+    def apply(self, msg):
+        # returns the full object list in draw order, None if the baseline is unknown
+        baseline = msg["baseline"]
+        if baseline and baseline not in self.states:
+            return None
+        state = dict(self.states[baseline]) if baseline else {}
+        for id_ in msg["removed"]:
+            state.pop(id_, None)
+        state.update(zip(msg["object_ids"], msg["info"]["objects"]))
+
+        self.seq = msg["seq"]
+        self.states[self.seq] = state
+        for seq in [seq for seq in self.states if seq < baseline or seq <= self.seq - HISTORY]:
+            del self.states[seq]
+        order = sorted(state, key=lambda id_: (DRAW_LAYERS.get(state[id_][0], 2), id_))
+        return [state[id_] for id_ in order]
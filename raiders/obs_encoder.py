@@ -0,0 +1,77 @@
+import numpy as np
+from attrdict import AttrDict
+
+
+class ObservationEncoder():
+    '''
+    Encodes what every player sees as fixed size NumPy arrays, built for all players at once from
+    the environment's EntityStore.
+
+    entities: float32 array of shape (players, max_entities, 7), the nearest entities within
+              view_range of the player (same square as getInputs), closest first. the columns are
+              FEATURES: type id (entity_store.KIND_TO_ID), position relative to the player,
+              size, health, team (-1 for neutral objects) and angle
+    mask: bool array of shape (players, max_entities), False for padding rows
+    vector_obs: float32 array of shape (players, 5), same as getInputs
+
+    The player itself is left out of its own entity list, its state is in vector_obs.
+    '''
+
+    FEATURES = ("type_id", "x", "y", "size", "health", "team", "angle")
+
+    def __init__(self, max_entities=64, view_range=320):
+        self.max_entities = max_entities
+        self.view_range = view_range
+
+    def allocate(self, num_players):
+        return AttrDict({
+            "entities": np.zeros((num_players, self.max_entities, len(self.FEATURES)), dtype=np.float32),
+            "mask": np.zeros((num_players, self.max_entities), dtype=bool),
+            "vector_obs": np.zeros((num_players, 5), dtype=np.float32),
+        })
+
+    def encode(self, env, ids=None, out=None):
+        store = env.entities
+        assert store is not None, "ObservationEncoder needs an env created with entity_store=True"
+        ids = list(env.players) if ids is None else ids
+        players = [env.players[id_] for id_ in ids]
+        out = out if out is not None else self.allocate(len(players))
+        out.entities[:] = 0
+        out.mask[:] = False
+
+        for i, player in enumerate(players):
+            out.vector_obs[i] = env.getVectorObs(player)
+
+        slots = store.slots()
+        if not players or not len(slots):
+            return out
+
+        centers = np.array([player.pos for player in players], dtype=np.float64)
+        own_slots = np.array([getattr(player, "slot", -1) for player in players])
+
+        rel = store.pos[slots][None, :, :] - centers[:, None, :]
+        visible = (np.abs(rel) <= self.view_range).all(axis=2) & (slots[None, :] != own_slots[:, None])
+        dist = np.where(visible, np.einsum("pmi,pmi->pm", rel, rel), np.inf)
+
+        k = min(self.max_entities, len(slots))
+        if k < len(slots):
+            nearest = np.argpartition(dist, k-1, axis=1)[:, :k]
+        else:
+            nearest = np.broadcast_to(np.arange(k), dist.shape)
+        order = np.argsort(np.take_along_axis(dist, nearest, axis=1), axis=1, kind="stable")
+        nearest = np.take_along_axis(nearest, order, axis=1)
+
+        valid = np.isfinite(np.take_along_axis(dist, nearest, axis=1))
+        selected = slots[nearest]
+        near_rel = rel[np.arange(len(players))[:, None], nearest]
+
+        entities = out.entities[:, :k]
+        entities[..., 0] = store.type_id[selected]
+        entities[..., 1:3] = near_rel
+        entities[..., 3] = store.size[selected]
+        entities[..., 4] = store.health[selected]
+        entities[..., 5] = store.team[selected]
+        entities[..., 6] = store.angle[selected]
+        entities[~valid] = 0
+        out.mask[:, :k] = valid
+        return out
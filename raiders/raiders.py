@@ -5,13 +5,19 @@ import keyboard as k
 from attrdict import AttrDict
 import math
 import pickle
+import bisect, heapq
+from itertools import chain
+from operator import attrgetter
 
 from abc import ABC, abstractmethod
 
 from sound_utils import SoundUtils
+from entity_store import EntityStore
+from obs_encoder import ObservationEncoder
+from storm_overlay import StormOverlay
+from sprite_atlas import toOpaque, atlasPath, saveAtlas, loadAtlas, rotateSprite
 
 pygame.init()
-pygame.display.set_mode((1, 1))  # Minimal dummy window
 
 
 def darken(color, scale=0.8):
@@ -29,38 +35,74 @@ def polygon(center, radius, n, flip=1):
         points.append((x+cx, y+cy))
     return points
 
-def cast(value: str):
-    value = value.strip()
-
-    # Try boolean first
-    if value.lower() == 'true':
-        return True
-    elif value.lower() == 'false':
-        return False
-
-    # Try integer
-    try:
-        return int(value)
-    except ValueError:
-        return value  # Return original string if no match
-        
-cache_folder = "assets_cache"
-
-image_files = [f for f in os.listdir(cache_folder) if f.endswith((".png", ".jpg", ".jpeg"))]
-keys = [tuple(cast(v) for v in info[:-4].split('_')) for info in image_files]
-
-sprites = {
-    "raider": pygame.image.load("assets/raider.png"),
-    "defender": pygame.image.load("assets/defender.png"),
-    "sword": pygame.image.load("assets/sword.png"),
-    "bow": pygame.image.load("assets/bow.png"),
-    "axe": pygame.image.load("assets/axe.png"),
-    "arrow": pygame.image.load("assets/arrow.png"),
+def sweepCircle(pos, dx, dy, subframes, target_pos, target_reach, map_size):
+    '''
+    Moves a circle from pos by (dx, dy) subframes times and tests every subframe against all targets at once.
+
+    target_pos is an (n, 2) array and target_reach the distance at which each target is hit.
+    positions are accumulated with repeated addition so they match stepping one subframe at a time.
+    returns the x and y of every subframe, the first subframe that leaves the map, the first subframe
+    that hits a target and the index of the first target hit on that subframe (subframes / -1 if none)
+    '''
+    xs = np.cumsum([pos[0]] + [dx]*subframes)[1:]
+    ys = np.cumsum([pos[1]] + [dy]*subframes)[1:]
+
+    inside = (0 <= xs) & (xs <= map_size[0]-1) & (0 <= ys) & (ys <= map_size[1]-1)
+    exit_frame = int(np.argmin(inside)) if not inside.all() else subframes
+
+    hit_frame, hit_idx = subframes, -1
+    if len(target_pos):
+        hits = np.hypot(target_pos[:,0] - xs[:,None], target_pos[:,1] - ys[:,None]) <= target_reach
+        frames = hits.any(axis=1)
+        if frames.any():
+            hit_frame = int(np.argmax(frames))
+            hit_idx = int(np.argmax(hits[hit_frame]))
+    return xs, ys, exit_frame, hit_frame, hit_idx
+
+# palette of the game, also what the sprites are drawn in
+COLORS = {
+    "white": (255, 255, 255),
+    "black": (0, 0, 0),
+    "orange": (170, 120, 55),
+    "brown": (120, 80, 60),
+    "lightbrown": (210, 170, 130),
+    "green": (100, 170, 70),
+    "darkgreen": (92, 135, 52),
+    "grey": (70, 70, 70),
+    "lightgrey": (130, 130, 130),
+    "lightergrey": (180, 180, 180),
+    "mutedred": (180, 120, 90),
+    "mutedlightred": (190, 145, 100),
+    "team2": (240, 140, 80),
+    "team1": (140, 190, 240),
 }
-for key, path in zip(keys, image_files):
-    surf = pygame.image.load(os.path.join(cache_folder, path)).convert()
-    surf.set_colorkey((0,0,0))
-    sprites[key] = surf
+
+def spriteParameters(colors=COLORS):
+    # everything RaiderEnvironment.buildSprites draws from, the sprite atlas is stored under it
+    stand_in = AttrDict({"colors": colors})
+    instances = Bush(stand_in, (0,0)), Tree(stand_in, (0,0)), Stone(stand_in, (0,0))
+    spike = Spike(stand_in, (0,0), 1, DUMMYPLAYER())
+    return (
+        tuple(dict(colors).items()),
+        *((instance.size, instance.health) for instance in instances),
+        spike.size,
+    )
+
+def loadImages():
+    return {
+        "raider": pygame.image.load("assets/raider.png"),
+        "defender": pygame.image.load("assets/defender.png"),
+        "sword": pygame.image.load("assets/sword.png"),
+        "bow": pygame.image.load("assets/bow.png"),
+        "axe": pygame.image.load("assets/axe.png"),
+        "arrow": pygame.image.load("assets/arrow.png"),
+    }
+
+# sprites of RaiderEnvironment.buildSprites keyed by spriteParameters, shared by every env in the process
+# and by workers forked after
+SPRITE_CACHE = {}
+
+sprites = loadImages()
 
 
 class StaticDisplays:
@@ -139,14 +181,12 @@ class StaticDisplays:
                     else:
                         scale = (frames[0] - attack_tick) / (frames[0]-frames[1]-anticipation)
                         attack_offset = rest*(1-scale) + windup*scale
-                rotated_image = pygame.transform.rotate(StaticDisplays.sprites["sword"], -(angle)/math.pi*180-attack_offset)
-                if frames[2] < attack_tick < frames[1]+anticipation:
-                    rotated_image.fill((100, 100, 100, 0), special_flags=pygame.BLEND_RGBA_ADD)
+                rotated_image = rotateSprite(StaticDisplays.sprites["sword"], angle, attack_offset, frames[2] < attack_tick < frames[1]+anticipation)
                 image_rect = rotated_image.get_rect()
                 image_rect.center = pos
                 surface.blit(rotated_image, image_rect)
             case 2:
-                rotated_image = pygame.transform.rotate(StaticDisplays.sprites["bow"], -(angle)/math.pi*180)
+                rotated_image = rotateSprite(StaticDisplays.sprites["bow"], angle)
                 image_rect = rotated_image.get_rect()
                 image_rect.center = pos
                 surface.blit(rotated_image, image_rect)
@@ -162,9 +202,7 @@ class StaticDisplays:
                     else:
                         scale = (frames[0] - attack_tick) / (frames[0]-frames[1]-anticipation)
                         attack_offset = rest*(1-scale) + windup*scale
-                rotated_image = pygame.transform.rotate(StaticDisplays.sprites["axe"], -(angle)/math.pi*180-attack_offset)
-                if frames[2] < attack_tick < frames[1]+anticipation:
-                    rotated_image.fill((100, 100, 100, 0), special_flags=pygame.BLEND_RGBA_ADD)
+                rotated_image = rotateSprite(StaticDisplays.sprites["axe"], angle, attack_offset, frames[2] < attack_tick < frames[1]+anticipation)
                 image_rect = rotated_image.get_rect()
                 image_rect.center = pos
                 surface.blit(rotated_image, image_rect)
@@ -307,7 +345,7 @@ class StaticDisplays:
     def Arrow_staticDisplay(surface, pos, info):
         x, y = pos
         _, _, _, health, angle, hit, r, g, b = info
-        rotated_image = pygame.transform.rotate(StaticDisplays.sprites["arrow"], -(angle)/math.pi*180)
+        rotated_image = rotateSprite(StaticDisplays.sprites["arrow"], angle)
         image_rect = rotated_image.get_rect()
         image_rect.center = pos
         surface.blit(rotated_image, image_rect)
@@ -365,6 +403,10 @@ class DUMMYPLAYER():
     def changeStone(self, v): pass
 
 class Player():
+    kind = "player"
+    # attributes modified in place that snapshots need their own copy of
+    snapshot_copy = ("pos", "frames", "events")
+
     def __init__(self, env, pos, team, id_):
         self.costs = AttrDict({
             "arrow": 2,
@@ -468,7 +510,7 @@ class Player():
         8: turret
         9: heal
         '''
-        self.objects = self.env.grid.getNearbyObjects(self.pos)
+        self.objects = self.env.grid.getNearbyObjects(self.pos, dynamic=True)
         
         if active:
             if active == 9 and self.active != 9:
@@ -570,7 +612,7 @@ class Player():
             p1 = np.add(self.pos, (dx,dy))
             p2 = np.add(self.pos, (2*dx,2*dy))
             p3 = np.add(self.pos, (3*dx,3*dy))
-            for obj in self.objects + self.env.dynamic_objects:
+            for obj in self.objects:
                 if isinstance(obj, Player) and obj.team == self.team:
                     continue
                 if obj not in self.hit_objects and \
@@ -658,7 +700,7 @@ class Player():
             return False
 
         if type(obj) in {WoodWall, StoneWall, Turret, Spike}:
-            for obj2 in self.objects + self.env.dynamic_objects:
+            for obj2 in self.objects:
                 if type(obj2) not in self.env.resources | self.env.walls | {Turret}:
                     continue
                 if math.dist(obj.pos, obj2.pos) <= obj.size + obj2.size - 0.5:
@@ -688,7 +730,7 @@ class Player():
         return True
 
     def updateMove(self):
-        for obj in self.objects + self.env.dynamic_objects:
+        for obj in self.objects:
             if obj is self:
                 continue
             if type(obj) not in {Player, Turret} | self.env.resources | self.env.walls:
@@ -740,15 +782,13 @@ class Player():
                     else:
                         scale = (self.frames[0] - self.attack_tick) / (self.frames[0]-self.frames[1]-anticipation)
                         attack_offset = rest*(1-scale) + windup*scale
-                rotated_image = pygame.transform.rotate(self.env.sprites.sword, -(self.angle)/math.pi*180-attack_offset)
-                if self.frames[2] < self.attack_tick < self.frames[1]+anticipation:
-                    rotated_image.fill((100, 100, 100, 0), special_flags=pygame.BLEND_RGBA_ADD)
+                rotated_image = rotateSprite(self.env.sprites.sword, self.angle, attack_offset, self.frames[2] < self.attack_tick < self.frames[1]+anticipation)
                 image_rect = rotated_image.get_rect()
                 image_rect.center = self.pos
                 self.env.surface.blit(rotated_image, image_rect)
                 #pygame.draw.circle(self.env.surface, self.env.colors.white, self.pos, self.size/2)
             case 2:
-                rotated_image = pygame.transform.rotate(self.env.sprites.bow, -(self.angle)/math.pi*180)
+                rotated_image = rotateSprite(self.env.sprites.bow, self.angle)
                 image_rect = rotated_image.get_rect()
                 image_rect.center = self.pos
                 self.env.surface.blit(rotated_image, image_rect)
@@ -764,9 +804,7 @@ class Player():
                     else:
                         scale = (self.frames[0] - self.attack_tick) / (self.frames[0]-self.frames[1]-anticipation)
                         attack_offset = rest*(1-scale) + windup*scale
-                rotated_image = pygame.transform.rotate(self.env.sprites.axe, -(self.angle)/math.pi*180-attack_offset)
-                if self.frames[2] < self.attack_tick < self.frames[1]+anticipation:
-                    rotated_image.fill((100, 100, 100, 0), special_flags=pygame.BLEND_RGBA_ADD)
+                rotated_image = rotateSprite(self.env.sprites.axe, self.angle, attack_offset, self.frames[2] < self.attack_tick < self.frames[1]+anticipation)
                 image_rect = rotated_image.get_rect()
                 image_rect.center = self.pos
                 self.env.surface.blit(rotated_image, image_rect)
@@ -903,7 +941,7 @@ class Effect():
     
     def step(self):
         if self.effect_tick == 0:
-            for obj in self.env.dynamic_objects:
+            for obj in self.env.grid.iterNearbyObjects(self.pos, dynamic=True, static=False, kinds={"player"}):
                 if not isinstance(obj, Player):
                     continue
                 else:
@@ -921,6 +959,8 @@ class Effect():
     def display(self): pass
 
 class Heal(Effect):
+    kind = "heal"
+
     def __init__(self, env, pos, player):
         super().__init__(env, pos, player)
         self.healing = 2
@@ -960,23 +1000,35 @@ class Projectile():
             return
         self.lifetime -= 1
 
-        self.objects = self.env.grid.getNearbyObjects(self.pos) + self.env.dynamic_objects
+        targets = [obj for obj in self.env.grid.iterNearbyObjects(self.pos, dynamic=True) if self.isTarget(obj)]
 
+        # all subframes are tested at once, the first subframe that leaves the map or hits something wins,
+        # leaving the map is checked first and ties between targets go to the earliest in grid order
         dx, dy = self.speed*math.cos(self.angle)/subframes, self.speed*math.sin(self.angle)/subframes
-        for frame in range(subframes):
-            self.pos = (self.pos[0]+dx, self.pos[1]+dy)
-            if not self.env.grid.withinBounds(self.pos):
-                self.env.removeDynamicObject(self)
-                return
-            for obj in self.objects:
-                if ((isinstance(obj, StaticObject) and (type(obj) not in (Base, StoneWall, Spike))) or (type(obj) in {Player, Turret, Base, Spike, StoneWall} and obj.team != self.team)) \
-                    and math.dist(obj.pos, self.pos) <= obj.size + self.size - 0.5:
-                    if isinstance(obj, Spike):
-                        continue
-                    obj.recieveHit(self, self.damage, self.player)
-                    self.env.removeDynamicObject(self)
-                    self.collision(obj)
-                    return
+        xs, ys, exit_frame, hit_frame, hit_idx = sweepCircle(
+            self.pos, dx, dy, subframes,
+            np.array([obj.pos for obj in targets], dtype=np.float64).reshape(-1, 2),
+            np.array([obj.size for obj in targets], dtype=np.float64) + self.size - 0.5,
+            self.env.map_size)
+
+        if exit_frame < subframes and exit_frame <= hit_frame:
+            self.pos = (float(xs[exit_frame]), float(ys[exit_frame]))
+            self.env.removeDynamicObject(self)
+            return
+        if hit_frame < subframes:
+            self.pos = (float(xs[hit_frame]), float(ys[hit_frame]))
+            obj = targets[hit_idx]
+            obj.recieveHit(self, self.damage, self.player)
+            self.env.removeDynamicObject(self)
+            self.collision(obj)
+            return
+        self.pos = (float(xs[-1]), float(ys[-1]))
+
+    def isTarget(self, obj):
+        # resources and wood walls block every projectile, spikes never do
+        if type(obj) in (Bush, Tree, Stone, WoodWall):
+            return True
+        return type(obj) in (Player, Turret, Base, StoneWall) and obj.team != self.team
     
     def collision(self, obj):
         pass
@@ -991,6 +1043,8 @@ class Projectile():
         pygame.draw.circle(self.env.surface, self.env.colors.white, self.pos, self.size)
 
 class Arrow(Projectile):
+    kind = "arrow"
+
     def __init__(self, env, pos, angle, team, player):
         super().__init__(env, pos, angle, team, player)
         self.damage = 3
@@ -1006,7 +1060,7 @@ class Arrow(Projectile):
             self.env.addSound("arrowhit", self.pos, 0.3)
 
     def display(self):
-        rotated_image = pygame.transform.rotate(self.env.sprites.arrow, -(self.angle)/math.pi*180)
+        rotated_image = rotateSprite(self.env.sprites.arrow, self.angle)
         image_rect = rotated_image.get_rect()
         image_rect.center = self.pos
         self.env.surface.blit(rotated_image, image_rect)
@@ -1023,6 +1077,8 @@ class Arrow(Projectile):
         })
 
 class ChargedArrow(Projectile):
+    kind = "chargedarrow"
+
     def __init__(self, env, pos, angle, team, player):
         super().__init__(env, pos, angle, team, player)
         self.damage = 3
@@ -1039,7 +1095,7 @@ class ChargedArrow(Projectile):
             self.env.addSound("arrowhit", self.pos, 0.3)
 
     def display(self):
-        rotated_image = pygame.transform.rotate(self.env.sprites.arrow, -(self.angle)/math.pi*180)
+        rotated_image = rotateSprite(self.env.sprites.arrow, self.angle)
         image_rect = rotated_image.get_rect()
         image_rect.center = self.pos
         self.env.surface.blit(rotated_image, image_rect)
@@ -1056,6 +1112,8 @@ class ChargedArrow(Projectile):
         })
 
 class Bullet(Projectile):
+    kind = "bullet"
+
     def __init__(self, env, pos, angle, team, player):
         super().__init__(env, pos, angle, team, player)
         self.damage = 5
@@ -1080,6 +1138,8 @@ class Bullet(Projectile):
         })
 
 class Frag():
+    kind = "frag"
+
     def __init__(self, env, pos, angle, team, player):
         self.env = env
         self.pos = pos
@@ -1101,24 +1161,34 @@ class Frag():
             return 
         self.lifetime -= 1
 
-        self.objects = self.env.grid.getNearbyObjects(self.pos) + self.env.dynamic_objects
+        targets = [obj for obj in self.env.grid.iterNearbyObjects(self.pos, dynamic=True) if self.isTarget(obj)]
 
+        # same sweep as Projectile.step, except the frag stops in front of the map edge instead of leaving it
         dx, dy = self.speed*math.cos(self.angle)/subframes, self.speed*math.sin(self.angle)/subframes
-        for frame in range(subframes):
-            if (not self.env.grid.withinBounds(np.add(self.pos, (dx,dy)))):
-                self.speed = 0
-                return
-            self.pos = (self.pos[0]+dx, self.pos[1]+dy)
-            for obj in self.objects:
-                if ((isinstance(obj, StaticObject) and type(obj) not in {Base, StoneWall, Spike, Turret}) or (type(obj) not in {Player} and obj.team != self.team)) \
-                    and math.dist(obj.pos, self.pos) <= obj.size + self.size - 0.5:
-                    if isinstance(obj, Projectile):
-                        continue
-                    self.speed = 0
-                    return
+        xs, ys, exit_frame, hit_frame, hit_idx = sweepCircle(
+            self.pos, dx, dy, subframes,
+            np.array([obj.pos for obj in targets], dtype=np.float64).reshape(-1, 2),
+            np.array([obj.size for obj in targets], dtype=np.float64) + self.size - 0.5,
+            self.env.map_size)
+
+        if exit_frame < subframes and exit_frame <= hit_frame:
+            if exit_frame > 0:
+                self.pos = (float(xs[exit_frame-1]), float(ys[exit_frame-1]))
+            self.speed = 0
+            return
+        if hit_frame < subframes:
+            self.pos = (float(xs[hit_frame]), float(ys[hit_frame]))
+            self.speed = 0
+            return
+        self.pos = (float(xs[-1]), float(ys[-1]))
         
         self.speed *= self.friction
 
+    def isTarget(self, obj):
+        if type(obj) is Player or isinstance(obj, Projectile):
+            return False
+        return (isinstance(obj, StaticObject) and type(obj) not in {Base, StoneWall, Spike, Turret}) or obj.team != self.team
+
     def resetState(self):
         pass
 
@@ -1135,6 +1205,8 @@ class Frag():
         })
 
 class Explosion():
+    kind = "explosion"
+
     def __init__(self, env, pos, team, player):
         self.env = env
         self.pos = pos
@@ -1153,7 +1225,7 @@ class Explosion():
             return
         self.lifetime -= 1
 
-        self.objects = self.env.grid.getNearbyObjects(self.pos) + self.env.dynamic_objects
+        self.objects = self.env.grid.getNearbyObjects(self.pos, dynamic=True)
         for obj in self.objects:
             if (math.dist(obj.pos, self.pos) <= obj.size + self.size - 0.5):
                 if type(obj) in {Player, Turret, Spike, Base}:
@@ -1177,6 +1249,8 @@ class Explosion():
         })
 
 class Turret():
+    kind = "turret"
+
     def __init__(self, env, pos, angle, team, player):
         self.env = env
         self.pos = pos
@@ -1195,8 +1269,6 @@ class Turret():
         self.hit = False
     
     def step(self):
-        self.objects = self.env.grid.getNearbyObjects(self.pos)
-
         closest_player = None
         closest_distance = math.inf
         for player in self.env.getPlayers():
@@ -1299,6 +1371,8 @@ class Turret():
         })
 
 class Bush(StaticObject):
+    kind = "bush"
+
     def __init__(self, env, pos):
         super().__init__(env, pos, 20, 15)
 
@@ -1320,6 +1394,8 @@ class Bush(StaticObject):
         })
 
 class Tree(StaticObject):
+    kind = "tree"
+
     def __init__(self, env, pos):
         super().__init__(env, pos, 30, 20)
 
@@ -1342,6 +1418,8 @@ class Tree(StaticObject):
         })
 
 class Stone(StaticObject):
+    kind = "stone"
+
     def __init__(self, env, pos):
         super().__init__(env, pos, 40, 50)
 
@@ -1362,6 +1440,8 @@ class Stone(StaticObject):
         })
 
 class WoodWall(StaticObject):
+    kind = "woodwall"
+
     def __init__(self, env, pos, team):
         super().__init__(env, pos, 20, 25)
         self.team = team
@@ -1399,6 +1479,8 @@ class WoodWall(StaticObject):
         })
 
 class StoneWall(StaticObject):
+    kind = "stonewall"
+
     def __init__(self, env, pos, team):
         super().__init__(env, pos, 30, 75)
         self.team = team
@@ -1437,6 +1519,8 @@ class StoneWall(StaticObject):
         })
     
 class Spike(StaticObject):
+    kind = "spike"
+
     def __init__(self, env, pos, team, player):
         super().__init__(env, pos, 17, 35)
         self.team = team
@@ -1483,6 +1567,8 @@ class Spike(StaticObject):
         })
 
 class Base(StaticObject):
+    kind = "base"
+
     def __init__(self, env, pos, team):
         super().__init__(env, pos, 40, 100)
         self.team = team
@@ -1542,12 +1628,15 @@ class Base(StaticObject):
     
 
 
+GRID_SEQ = attrgetter("grid_seq")
+
 class GridCell():
     def __init__(self, idx, gridsize):
         self.idx = idx
         self.x, self.y = idx[0]*gridsize, idx[1]*gridsize
         self.gridsize = gridsize
         self.objects = []
+        self.dynamic_objects = []
 
     def withinBounds(self, pos):
         x2, y2 = pos
@@ -1578,6 +1667,17 @@ class Grid():
 
         self.DUMMYCELL = GridCell((-1, -1), gridsize)
 
+        # moving objects are filed by the cell they were in at the last updateDynamicObjects.
+        # they move far less than a cell per step, so the default 3x3 neighborhood still covers them
+        self.max_idx = (math.ceil(self.env.map_size[0]/gridsize)-1, math.ceil(self.env.map_size[1]/gridsize)-1)
+        self.dynamic_seq = 0
+
+        # neighbor cell tables, neighborhoods[size][idx] holds the cells around idx that exist
+        self.neighborhoods = {}
+        for size in (1, 2):
+            for idx in self.grid:
+                self.getNeighborhood(idx, size)
+
     def withinBounds(self, pos):
         x, y = pos
         return (0 <= x <= self.env.map_size[0]-1) and (0 <= y <= self.env.map_size[1]-1)
@@ -1596,9 +1696,66 @@ class Grid():
 
         return tuple(neighboring_cells)
 
-    def getNearbyObjects(self, pos, size=1):
-        idx = pos[0]//self.gridsize, pos[1]//self.gridsize
-        return sum((cell.objects for cell in self.getNeighboringCells(idx, size)), start=[])
+    def getNeighborhood(self, idx, size=1):
+        table = self.neighborhoods.get(size)
+        if table is None:
+            table = self.neighborhoods[size] = {}
+        cells = table.get(idx)
+        if cells is None:
+            cells = tuple(cell for cell in self.getNeighboringCells(idx, size) if cell is not self.DUMMYCELL)
+            table[idx] = cells
+        return cells
+
+    def iterNearbyObjects(self, pos, size=1, dynamic=False, static=True, kinds=None):
+        '''
+        Iterates over the objects in the cells around pos without building intermediate lists.
+        dynamic objects follow the static ones, in env.dynamic_objects order. kinds optionally
+        restricts the result to a set of object kinds. the cells must not be modified while iterating,
+        use getNearbyObjects when objects can be added or removed along the way
+        '''
+        cells = self.getNeighborhood((int(pos[0]//self.gridsize), int(pos[1]//self.gridsize)), size)
+        objects = chain.from_iterable(cell.objects for cell in cells) if static else iter(())
+        if dynamic:
+            objects = chain(objects, heapq.merge(*(cell.dynamic_objects for cell in cells), key=GRID_SEQ))
+        if kinds is not None:
+            objects = (obj for obj in objects if obj.kind in kinds)
+        return objects
+
+    def getNearbyObjects(self, pos, size=1, dynamic=False, kinds=None):
+        return list(self.iterNearbyObjects(pos, size, dynamic, kinds=kinds))
+
+    def getNearbyDynamicObjects(self, pos, size=1, kinds=None):
+        return list(self.iterNearbyObjects(pos, size, dynamic=True, static=False, kinds=kinds))
+
+    def getDynamicCell(self, pos):
+        # objects slightly outside of the map are kept in the nearest edge cell
+        x = min(max(int(pos[0]//self.gridsize), 0), self.max_idx[0])
+        y = min(max(int(pos[1]//self.gridsize), 0), self.max_idx[1])
+        return self.grid[(x,y)]
+
+    def addDynamicObject(self, obj):
+        obj.grid_seq = self.dynamic_seq
+        self.dynamic_seq += 1
+        obj.grid_cell = self.getDynamicCell(obj.pos)
+        obj.grid_cell.dynamic_objects.append(obj)
+
+    def removeDynamicObject(self, obj):
+        obj.grid_cell.dynamic_objects.remove(obj)
+
+    def clear(self):
+        for cell in self.grid.values():
+            cell.objects.clear()
+            cell.dynamic_objects.clear()
+        self.dynamic_seq = 0
+
+    def updateDynamicObjects(self):
+        for obj in self.env.dynamic_objects:
+            cell = self.getDynamicCell(obj.pos)
+            if cell is not obj.grid_cell:
+                obj.grid_cell.dynamic_objects.remove(obj)
+                # cells stay sorted by insertion order so neighborhoods can be merged lazily
+                bisect.insort(cell.dynamic_objects, obj, key=GRID_SEQ)
+                obj.grid_cell = cell
 
     def addObject(self, obj):
         pos = obj.pos
@@ -1611,6 +1768,50 @@ class Grid():
         self.grid[(x,y)].removeObject(obj)
 
 
+ENTITY_CLASSES = {cls.kind: cls for cls in (
+    Player, Heal, Arrow, ChargedArrow, Bullet, Frag, Explosion, Turret,
+    Bush, Tree, Stone, WoodWall, StoneWall, Spike, Base,
+)}
+
+# attributes left out of snapshots, they are rebuilt on restore or recomputed every step
+SNAPSHOT_SKIP = ("env", "grid_cell", "slot", "objects")
+
+# everything else is only ever reassigned, so snapshots share the values with the live objects
+# except for the attributes a class lists in snapshot_copy
+SNAPSHOT_COPY = {cls.kind: getattr(cls, "snapshot_copy", ()) for cls in ENTITY_CLASSES.values()}
+
+def snapshotEntity(obj, refs):
+    # copy of obj.__dict__ with references to other entities replaced by their index in the snapshot
+    attrs = obj.__dict__.copy()
+    for key in SNAPSHOT_SKIP:
+        attrs.pop(key, None)
+    for key in SNAPSHOT_COPY[obj.kind]:
+        value = attrs[key]
+        attrs[key] = type(value)(value)
+    if "player" in attrs:
+        attrs["player"] = refs[id(attrs["player"])]
+    if "hit_objects" in attrs:
+        attrs["hit_objects"] = {refs[id(obj2)] for obj2 in attrs["hit_objects"] if id(obj2) in refs}
+    return (obj.kind, attrs)
+
+def restoreEntity(env, kind, attrs):
+    cls = ENTITY_CLASSES[kind]
+    obj = cls.__new__(cls)
+    state = attrs.copy()
+    for key in SNAPSHOT_COPY[kind]:
+        value = state[key]
+        state[key] = type(value)(value)
+    state["env"] = env
+    state["slot"] = -1
+    obj.__dict__ = state
+    return obj
+
+
+# the client only draws through StaticDisplays, it reads the atlas saved by an env (an env that has to draw
+# the atlas fills these in as well)
+StaticDisplays.sprites.update(loadAtlas(atlasPath(spriteParameters())) or {})
+
+
 class Camera():
     def __init__(self, env):
         self.env = env
@@ -1642,23 +1843,39 @@ class Camera():
         
 
 class RaiderEnvironment():
-    def __init__(self):
-        self.colors = AttrDict({
-            "white": (255, 255, 255),
-            "black": (0, 0, 0),
-            "orange": (170, 120, 55),
-            "brown": (120, 80, 60),
-            "lightbrown": (210, 170, 130),
-            "green": (100, 170, 70),
-            "darkgreen": (92, 135, 52),
-            "grey": (70, 70, 70),
-            "lightgrey": (130, 130, 130),
-            "lightergrey": (180, 180, 180),
-            "mutedred": (180, 120, 90),
-            "mutedlightred": (190, 145, 100),
-            "team2": (240, 140, 80),
-            "team1": (140, 190, 240),
-        })
+    def __init__(self, render_mode="human", entity_store=False, obs_mode="dict", max_entities=64):
+        '''
+        render_mode:
+            "human": the world is drawn every step and a window is opened for display
+            "rgb_array": the world is drawn every step offscreen, no window is opened
+            None: headless, step only advances the game logic. the world is drawn lazily
+                  when a frame or image observation is requested (render, getImageObs)
+        entity_store:
+            mirror every entity into an EntityStore (self.entities) for bulk array queries. the storm
+            damage pass and the tensor observations read it, collisions and dict observations stay on
+            the grid since the order they visit objects in is part of the game's trajectory. off by
+            default, as keeping the store in sync costs a little on every add, remove and step
+        obs_mode:
+            "dict": per player AttrDicts of nearby objects, see getInputs
+            "tensor": fixed size arrays for all players built in one pass, see ObservationEncoder.
+                      each player's observation holds views of its row in the batch.
+                      implies entity_store=True
+            None: no observations are built, reset and step return empty dicts. for rollouts
+                  and other uses that only need the game state
+        max_entities:
+            number of entity rows per player in "tensor" mode
+        '''
+        if render_mode not in ("human", "rgb_array", None):
+            raise ValueError(f"Invalid render_mode: {render_mode}")
+        if obs_mode not in ("dict", "tensor", None):
+            raise ValueError(f"Invalid obs_mode: {obs_mode}")
+        self.render_mode = render_mode
+        self.obs_mode = obs_mode
+        self.obs_encoder = ObservationEncoder(max_entities) if obs_mode == "tensor" else None
+        self.use_entity_store = entity_store or obs_mode == "tensor"
+        self.entities = None
+
+        self.colors = AttrDict(COLORS)
 
         self.resources = {Bush, Tree, Stone}
         self.walls = {WoodWall, StoneWall, Spike}
@@ -1676,10 +1893,27 @@ class RaiderEnvironment():
         self.dummy_player = DUMMYPLAYER()
 
         self.surface = pygame.Surface(self.map_size, pygame.SRCALPHA)
+        # static layers kept between renders, see updateStaticLayers
         self.background_surface = pygame.Surface(self.map_size, pygame.SRCALPHA)
-        self.screen = pygame.display.set_mode(self.screen_size)
+        self.background_surface.set_alpha(None)  # fully opaque, blit it as a plain copy
+        self.canopy_surface = pygame.Surface(self.map_size, pygame.SRCALPHA)
+        self.static_state = None
+        self.storm_overlay = StormOverlay()
+        self.screen = None
+        if self.render_mode == "human":
+            self.initializeDisplay()
         self.clock = pygame.time.Clock()
         self.t = 0
+        self.rendered_t = None
+
+        # image observations, outside of the map is padded with the camera background color
+        self.image_obs_scale = 0.25
+        self.image_obs_size = int(600*self.image_obs_scale)
+        small_size = int(self.map_size[0]*self.image_obs_scale), int(self.map_size[1]*self.image_obs_scale)
+        self.small_surface = pygame.Surface(small_size, pygame.SRCALPHA)
+        self.image_buffer = np.empty((small_size[0]+2*self.image_obs_size, small_size[1]+2*self.image_obs_size, 3), dtype=np.uint8)
+        self.image_buffer[:] = self.colors.grey
+        self.image_buffer_stale = True
 
         self.metadata = AttrDict({
             "colors": self.colors,
@@ -1693,36 +1927,139 @@ class RaiderEnvironment():
 
         self.initializeSprites()
 
+        # every random draw of the game goes through this so reset(seed=...) fixes the whole trajectory
+        self.rng = random.Random()
+        self.seed = None
+
+        # optional replay_utils.ReplayRecorder, notified of resets, roster changes and actions
+        self.recorder = None
+
         self.players = {}
         self.reset()
 
+    def initializeDisplay(self):
+        # the window is only opened on demand so headless envs never touch the video driver
+        if self.screen is None:
+            self.screen = pygame.display.set_mode(self.screen_size)
+        return self.screen
+
+    def getState(self):
+        '''
+        Snapshot of the game: tick, storm, random state and every player, structure, resource,
+        projectile, effect and the base, plus removed players whose objects are still around. The snapshot only holds plain Python values and NumPy
+        arrays (no surfaces or references back into the environment) so it can be pickled,
+        and restoring it with setState any number of times gives back the same game.
+        '''
+        entities = list(self.players.values())
+        for obj in chain(self.objects, self.dynamic_objects, self.effects, (self.base,)):
+            if not isinstance(obj, Player):
+                entities.append(obj)
+        refs = {id(obj): i for i, obj in enumerate(entities)}
+        refs[id(self.dummy_player)] = -1
+        # players that left while their structures or projectiles are still around are kept as owners
+        for obj in list(entities):
+            owner = getattr(obj, "player", None)
+            if owner is not None and id(owner) not in refs:
+                refs[id(owner)] = len(entities)
+                entities.append(owner)
+
+        return {
+            "t": self.t,
+            "storm_size": self.storm_size,
+            "seed": self.seed,
+            "rng": self.rng.getstate(),
+            "sounds": list(self.sounds),
+            "dynamic_seq": self.grid.dynamic_seq,
+            "entities": [snapshotEntity(obj, refs) for obj in entities],
+            "players": [(id_, refs[id(player)]) for id_, player in self.players.items()],
+            "objects": [refs[id(obj)] for obj in self.objects],
+            "dynamic_objects": [refs[id(obj)] for obj in self.dynamic_objects],
+            "effects": [refs[id(obj)] for obj in self.effects],
+            "base": refs[id(self.base)],
+        }
+
+    def setState(self, state):
+        # restore a snapshot from getState, the snapshot itself is left untouched and can be reused
+        entities = [restoreEntity(self, kind, attrs) for kind, attrs in state["entities"]]
+        for obj in entities:
+            player = getattr(obj, "player", None)
+            if type(player) is int:
+                obj.player = self.dummy_player if player == -1 else entities[player]
+            if isinstance(obj, Player):
+                obj.hit_objects = {entities[i] for i in obj.hit_objects}
+                obj.objects = []
+
+        self.players = {id_: entities[i] for id_, i in state["players"]}
+        self.objects = [entities[i] for i in state["objects"]]
+        self.dynamic_objects = [entities[i] for i in state["dynamic_objects"]]
+        self.effects = [entities[i] for i in state["effects"]]
+        self.base = entities[state["base"]]
+
+        # objects are filed in the same order they were, dynamic ones keep their sequence numbers
+        self.grid.clear()
+        for obj in self.objects:
+            self.grid.addObject(obj)
+        for obj in self.dynamic_objects:
+            obj.grid_cell = self.grid.getDynamicCell(obj.pos)
+            obj.grid_cell.dynamic_objects.append(obj)
+        self.grid.dynamic_seq = state["dynamic_seq"]
+
+        if self.use_entity_store:
+            self.entities = EntityStore()
+            for obj in chain(self.objects, self.dynamic_objects, self.effects):
+                self.entities.add(obj)
+
+        self.t = state["t"]
+        self.storm_size = state["storm_size"]
+        self.seed = state["seed"]
+        self.rng.setstate(state["rng"])
+        self.sounds = list(state["sounds"])
+        self.metadata.time = self.t
+        self.metadata.storm_size = self.storm_size
+        self.rendered_t = None
+        self.static_state = None
+        if self.recorder is not None:
+            self.recorder.recordSetState(self)
+
     def getPlayers(self):
         return tuple(self.players.values())
 
     def addPlayer(self, id_, team, name=None):
         team = 1 if team=="defender" else 2
+        if self.recorder is not None:
+            self.recorder.recordAddPlayer(id_, team, name)
         player = Player(self, (-1,-1), team, id_)
         if name is not None:
             player.name = name
         self.initializePlayer(player, team)
         self.players[id_] = player
-        self.dynamic_objects.append(player)
+        self.addDynamicObject(player)
+        self.rendered_t = None
 
     def removePlayer(self, id_):
+        if self.recorder is not None:
+            self.recorder.recordRemovePlayer(id_)
         player = self.players[id_]
-        if player in self.dynamic_objects:
-            self.dynamic_objects.remove(player)
+        self.removeDynamicObject(player)
         del self.players[id_]
+        self.rendered_t = None
 
     def initializeSprites(self):
-        self.sprites = AttrDict({
-            "raider": pygame.image.load("assets/raider.png"),
-            "defender": pygame.image.load("assets/defender.png"),
-            "sword": pygame.image.load("assets/sword.png"),
-            "bow": pygame.image.load("assets/bow.png"),
-            "axe": pygame.image.load("assets/axe.png"),
-            "arrow": pygame.image.load("assets/arrow.png"),
-        })
+        params = spriteParameters(self.colors)
+        if params not in SPRITE_CACHE:
+            # drawn once per set of parameters, then read back from the atlas by every process
+            path = atlasPath(params)
+            atlas = loadAtlas(path)
+            if atlas is None:
+                atlas = self.buildSprites()
+                saveAtlas(path, atlas)
+            SPRITE_CACHE[params] = {**loadImages(), **atlas}
+            if params == spriteParameters():
+                StaticDisplays.sprites.update(atlas)
+        self.sprites = AttrDict(SPRITE_CACHE[params])
+
+    def buildSprites(self):
+        self.sprites = AttrDict()
 
         image_size = (100, 100)
         center = (50, 50)
@@ -1775,17 +2112,15 @@ class RaiderEnvironment():
             pygame.draw.circle(self.spike_surface, darken(self.colors.brown, scale=1.1), center, size-1.5)
             pygame.draw.circle(self.spike_surface, color, center, size-9)
 
-            opaque = self.spike_surface.convert()
+            opaque = toOpaque(self.spike_surface)
             opaque.set_colorkey((0, 0, 0))
             self.sprites[(team, False)] = opaque
-            opaque = self.spike_surface.convert()
+            opaque = toOpaque(self.spike_surface)
             opaque.set_colorkey((0, 0, 0))
             self.fill_visible_pixels(opaque)
             self.sprites[(team, True)] = opaque
         
-        for name, surf in self.sprites.items():
-            if isinstance(name, tuple):
-                pygame.image.save(surf, f"assets_cache/{'_'.join(str(s) for s in name)}.png")
+        return {key: surf for key, surf in self.sprites.items() if isinstance(key, tuple)}
 
     
     def generateHealthLookups(self, type, surface, instance):
@@ -1800,13 +2135,10 @@ class RaiderEnvironment():
             scaled_image_rect = scaled_image.get_rect(center=center)
             canvas = pygame.Surface(image_size, pygame.SRCALPHA)
             canvas.blit(scaled_image, scaled_image_rect)
-            opaque = canvas.convert()
-
-            opaque = canvas.convert()
+            opaque = toOpaque(canvas)
             opaque.set_colorkey((0, 0, 0))
             self.sprites[(type, i+1, False)] = opaque
-            opaque = canvas.convert()
-            opaque.set_colorkey((0, 0, 0))
+            opaque = opaque.copy()
             self.fill_visible_pixels(opaque)
             self.sprites[(type, i+1, True)] = opaque
 
@@ -1815,14 +2147,9 @@ class RaiderEnvironment():
         if colorkey is None:
             raise ValueError("Surface must have a colorkey set")
 
-        surface.lock()
-        width, height = surface.get_size()
-
-        for x in range(width):
-            for y in range(height):
-                if surface.get_at((x, y))[:3] != colorkey[:3]:
-                    surface.set_at((x, y), fill_color)
-        surface.unlock()
+        pixels = pygame.surfarray.pixels3d(surface)
+        pixels[(pixels != colorkey[:3]).any(axis=2)] = fill_color[:3]
+        del pixels  # unlocks the surface
     
     def drawSprite(self, sprite, pos, health, hit):
         if health == -1:
@@ -1832,15 +2159,24 @@ class RaiderEnvironment():
         rect = sprite_surface.get_rect(center=pos)
         self.surface.blit(sprite_surface, rect)
 
-    def reset(self):
+    def reset(self, seed=None):
+        # without a seed the environment keeps drawing from its current generator
+        if seed is not None:
+            self.seed = seed
+            self.rng.seed(seed)
+        if self.recorder is not None:
+            self.recorder.recordReset(self, seed)
+
         self.grid = Grid(self, 200)
         self.base = Base(self, (self.map_size[0]/2, self.map_size[1]/2), 1)
         self.storm_size = self.max_storm_size
         self.t = 0
+        self.rendered_t = None
 
         self.metadata.time = self.t
         self.metadata.storm_size = self.storm_size
 
+        self.entities = EntityStore() if self.use_entity_store else None
         self.objects = []
         self.addDeposits()
         self.effects = []
@@ -1854,17 +2190,12 @@ class RaiderEnvironment():
             self.initializePlayer(player, team)
             self.players[id_] = player
         
-        self.dynamic_objects = [player for player in self.players.values()]
+        self.dynamic_objects = []
+        for player in self.players.values():
+            self.addDynamicObject(player)
         self.addDynamicObject(self.base)
 
-        observations = {}
-        info = {"team_observations": {"defender": {}, "raider": {}} }
-        for id_, player in self.players.items():
-            team = "defender" if player.team==1 else "raider"
-            obs = self.getInputs(id_)
-            info["team_observations"][team][id_] = obs
-            observations[id_] = obs
-        info = AttrDict(info)
+        observations, info = self.getObservations()
         return observations, info
     
     def initializePlayer(self, player, team):
@@ -1911,7 +2242,7 @@ class RaiderEnvironment():
         check = False
         count = 15
         while not check and count:
-            theta = random.random()*2*math.pi
+            theta = self.rng.random()*2*math.pi
             if obj is None:
                 return r*math.cos(theta) + self.map_size[0]/2, r*math.sin(theta) + self.map_size[1]/2
             obj.pos = (r*math.cos(theta) + self.map_size[0]/2, r*math.sin(theta) + self.map_size[1]/2)
@@ -1922,42 +2253,68 @@ class RaiderEnvironment():
             count -= 1
         
     def getSpawnLoc2(self, r):
-        theta = random.random()*2*math.pi
-        r = r * math.sqrt(random.random())
+        theta = self.rng.random()*2*math.pi
+        r = r * math.sqrt(self.rng.random())
         return r * math.cos(theta) + self.center[0], r * math.sin(theta) + self.center[1]
 
     def getSpawnLoc(self):
         x, y = self.map_size[0]/2, self.map_size[1]/2
         while (x > 0.25*self.map_size[0] and x < 0.75*self.map_size[0] and \
                y > 0.25*self.map_size[1] and y < 0.75*self.map_size[1]):
-            x, y = random.randint(50, self.map_size[0]-50), random.randint(50, self.map_size[1]-50)
+            x, y = self.rng.randint(50, self.map_size[0]-50), self.rng.randint(50, self.map_size[1]-50)
         return x, y
 
     def addObject(self, obj):
         self.objects.append(obj)
         self.grid.addObject(obj)
+        if self.entities is not None:
+            self.entities.add(obj)
 
     def removeObject(self, obj):
         if obj not in self.objects:
             return
         self.objects.remove(obj)
         self.grid.removeObject(obj)
+        if self.entities is not None:
+            self.entities.remove(obj)
     
     def addDynamicObject(self, obj):
         self.dynamic_objects.append(obj)
+        self.grid.addDynamicObject(obj)
+        if self.entities is not None:
+            self.entities.add(obj)
     
     def removeDynamicObject(self, obj):
         if obj not in self.dynamic_objects:
             return
         self.dynamic_objects.remove(obj)
+        self.grid.removeDynamicObject(obj)
+        if self.entities is not None:
+            self.entities.remove(obj)
     
     def addEffect(self, obj):
         self.effects.append(obj)
+        if self.entities is not None:
+            self.entities.add(obj)
     
     def removeEffect(self, obj):
         self.effects.remove(obj)
+        if self.entities is not None:
+            self.entities.remove(obj)
 
     def step(self, actions, display=False):
+        # check every action before anything changes, so a rejected step leaves the game (and its replay) as it was
+        for n, action in actions.items():
+            if self.players[n].health <= 0: continue
+            ax, ay, active, action_, angle = action
+            assert (0 <= ax <= 2) and (int(ax) == ax), f"Invalid Action[0]: {ax}, {ay}, {active}, {action_}, {angle}"
+            assert (0 <= ay <= 2) and (int(ay) == ay), f"Invalid Action[1]: {ax}, {ay}, {active}, {action_}, {angle}"
+            assert (0 <= active <= 9) and (int(active) == active), f"Invalid Action[2]: {ax}, {ay}, {active}, {action_}, {angle}"
+            assert (0 <= action_ <= 1) and (int(action_) == action_), f"Invalid Action[3]: {ax}, {ay}, {active}, {action_}, {angle}"
+            assert (0 <= angle <= 4) and (int(angle) == angle), f"Invalid Action[4]: {ax}, {ay}, {active}, {action_}, {angle}"
+        if self.recorder is not None:
+            self.recorder.recordStep(self, actions)
+
         self.t += 1
         self.storm_size = max(0, min(1, (self.t - 180*20) / (300*20 - 180*20))) * (self.min_storm_size - self.max_storm_size) + self.max_storm_size
         self.metadata.time = self.t
@@ -1967,15 +2324,10 @@ class RaiderEnvironment():
         for obj in self.objects + self.dynamic_objects:
             obj.resetState()
 
+        self.grid.updateDynamicObjects()
+
         for n, action in actions.items():
             if self.players[n].health <= 0: continue
-            # check to see if actions are valid
-            ax, ay, active, action_, angle = action
-            assert (0 <= ax <= 2) and (int(ax) == ax), f"Invalid Action[0]: {ax}, {ay}, {active}, {action_}, {angle}"
-            assert (0 <= ay <= 2) and (int(ay) == ay), f"Invalid Action[1]: {ax}, {ay}, {active}, {action_}, {angle}"
-            assert (0 <= active <= 9) and (int(active) == active), f"Invalid Action[2]: {ax}, {ay}, {active}, {action_}, {angle}"
-            assert (0 <= action_ <= 1) and (int(action_) == action_), f"Invalid Action[3]: {ax}, {ay}, {active}, {action_}, {angle}"
-            assert (0 <= angle <= 4) and (int(angle) == angle), f"Invalid Action[4]: {ax}, {ay}, {active}, {action_}, {angle}"
             dx = action[0] - 1
             dy = action[1] - 1
             active = action[2]
@@ -1983,6 +2335,8 @@ class RaiderEnvironment():
             angle = 0.0981747704247 * (action[4]-2) * (abs(action[4]-2))
             self.players[n].step(dx, dy, active, attack, angle)
 
+        self.grid.updateDynamicObjects()
+
         for obj in self.dynamic_objects:
             if isinstance(obj, Player):
                 continue
@@ -1991,41 +2345,71 @@ class RaiderEnvironment():
         for obj in self.effects:
             obj.step()
 
+        self.grid.updateDynamicObjects()
+
+        if self.entities is not None:
+            self.entities.sync()
+
         if self.t % 20 == 0:
-            for player in self.getPlayers():
-                if math.dist(player.pos, self.center) > self.storm_size:
-                    player.recieveHit(self.dummy_player, 5, self.dummy_player)
+            if self.entities is not None:
+                # dead players are no longer in the store, recieveHit ignores them anyway
+                slots = self.entities.slots(("player",))
+                d = np.hypot(*(self.entities.pos[slots] - self.center).T)
+                storm_players = [self.entities.view(slot) for slot in slots[d > self.storm_size]]
+            else:
+                storm_players = [player for player in self.getPlayers() if math.dist(player.pos, self.center) > self.storm_size]
+            for player in storm_players:
+                player.recieveHit(self.dummy_player, 5, self.dummy_player)
+                if self.entities is not None and player.slot >= 0:
+                    self.entities.update(player)
 
 
-        pygame.event.pump()
-        self.surface.fill(self.colors.green)
+        done, winning_team = self.gameIsDone()
 
-        for obj in self.effects:
-            obj.display()
-        
-        self.base.display()
+        if self.render_mode is not None:
+            self.render()
 
-        for obj in self.objects:
-            if isinstance(obj, Tree):
-                continue
-            obj.display()
+        observations, info = self.getObservations()
+
+        term = False
+
+        if display:
+            self.render()
+            self.initializeDisplay()
+            frame = self.camera.getFrame(self.surface)
+            frame = pygame.transform.flip(frame, False, True)
+            pygame.transform.scale(frame, self.screen_size, self.screen)
+            pygame.display.flip()
+            self.clock.tick(20)
+
+        return observations, winning_team, done, term, info
+
+    def render(self):
+        # draw the current game state onto self.surface, skipped if it is already up to date
+        if self.rendered_t == self.t:
+            return self.surface
+        self.rendered_t = self.t
+        self.image_buffer_stale = True
+
+        if self.screen is not None:
+            pygame.event.pump()
+        self.updateStaticLayers()
+        self.surface.blit(self.background_surface, (0, 0))
+
+        moving = []
         for obj in self.dynamic_objects:
             if isinstance(obj, Player) or isinstance(obj, Base):
                 continue
             obj.display() 
+            moving.append(obj)
         for obj in self.getPlayers():
             if obj.health <= 0: 
                 continue
             obj.display()
-        for obj in self.objects:
-            if not isinstance(obj, Tree):
-                continue
-            obj.display()
+            moving.append(obj)
+        self.restoreCanopy(moving)
 
-        mask = pygame.Surface(self.map_size, pygame.SRCALPHA)
-        mask.fill((255, 0, 0, 120))  # semi-transparent red
-        pygame.draw.circle(mask, (0, 0, 0, 0), self.center, int(self.storm_size))  # transparent center
-        self.surface.blit(mask, (0, 0))
+        self.storm_overlay.draw(self.surface, self.center, int(self.storm_size))
 
         for player in self.getPlayers():
             if player.health <= 0:
@@ -2038,27 +2422,86 @@ class RaiderEnvironment():
                 absorption_ratio = health_ratio - 1
                 pygame.draw.rect(self.surface, (255,220,90), (player.pos[0]+(bar_width-3)*(0.5-absorption_ratio), player.pos[1]+21, (bar_width-3)*absorption_ratio, 3))
 
-        done, winning_team = self.gameIsDone()
+        return self.surface
 
-        observations = {}
-        info = {"team_observations": {"defender": {}, "raider": {}} }
-        for id_, player in self.players.items():
-            team = "defender" if player.team==1 else "raider"
-            obs = self.getInputs(id_)
-            info["team_observations"][team][id_] = obs
-            observations[id_] = obs
-        info = AttrDict(info)
-
-        term = False
+    def getStaticObjects(self):
+        # everything drawn on the static layers, in drawing order
+        return chain(
+            self.effects,
+            (self.base,),
+            (obj for obj in self.objects if not isinstance(obj, Tree)),
+            (obj for obj in self.objects if isinstance(obj, Tree)),
+        )
 
-        if display:
-            frame = self.camera.getFrame(self.surface)
-            frame = pygame.transform.flip(frame, False, True)
-            pygame.transform.scale(frame, self.screen_size, self.screen)
-            pygame.display.flip()
-            self.clock.tick(20)
+    @staticmethod
+    def staticRect(obj):
+        # area an object draws into, sprites are 100x100 around their position
+        half = max(50, getattr(obj, "size", 0) + 5) + 1
+        return pygame.Rect(int(obj.pos[0]-half), int(obj.pos[1]-half), 2*half, 2*half)
 
-        return observations, winning_team, done, term, info
+    def updateStaticLayers(self):
+        '''
+        Keeps background_surface (grass, effects, base, resources and walls, trees on top) and
+        canopy_surface (only the trees, transparent elsewhere) up to date. Only the areas of objects
+        that were added, removed or changed health or hit state since the last render are redrawn,
+        everything when most of the map changed (reset, setState).
+        '''
+        previous = self.static_state
+        state = {}
+        dirty = []
+        for obj in self.getStaticObjects():
+            key = (getattr(obj, "health", None), getattr(obj, "hit", None))
+            old = previous.get(obj) if previous is not None else None
+            if old is None:
+                rect = self.staticRect(obj)
+                dirty.append(rect)
+            else:
+                rect = old[1]
+                if old[0] != key:
+                    dirty.append(rect)
+            state[obj] = (key, rect)
+        if previous is not None:
+            dirty.extend(rect for obj, (key, rect) in previous.items() if obj not in state)
+        self.static_state = state
+
+        if previous is None or len(dirty) > 64:
+            dirty = [self.background_surface.get_rect()]
+        for rect in dirty:
+            self.redrawStaticArea(rect)
+
+    def redrawStaticArea(self, rect):
+        surface = self.surface
+        self.background_surface.set_clip(rect)
+        self.canopy_surface.set_clip(rect)
+        self.background_surface.fill(self.colors.green)
+        self.canopy_surface.fill((0, 0, 0, 0))
+        try:
+            # display() draws onto self.surface, point it at the layer being rebuilt
+            self.surface = self.background_surface
+            for obj, (key, obj_rect) in self.static_state.items():
+                if obj_rect.colliderect(rect):
+                    obj.display()
+            self.surface = self.canopy_surface
+            for obj, (key, obj_rect) in self.static_state.items():
+                if isinstance(obj, Tree) and obj_rect.colliderect(rect):
+                    obj.display()
+        finally:
+            self.surface = surface
+            self.background_surface.set_clip(None)
+            self.canopy_surface.set_clip(None)
+
+    def restoreCanopy(self, objects):
+        # trees are drawn over everything that moves, put them back where those objects overlap them
+        areas = set()
+        for obj in objects:
+            half = max(getattr(obj, "size", 0) + 5, 90)
+            rect = pygame.Rect(int(obj.pos[0]-half), int(obj.pos[1]-half), 2*half, 2*half)
+            for tree in self.grid.iterNearbyObjects(obj.pos, kinds={"tree"}):
+                area = rect.clip(self.static_state[tree][1])
+                if area:
+                    areas.add(tuple(area))
+        for area in areas:
+            self.surface.blit(self.canopy_surface, area, area)
 
     def gameIsDone(self):
         if self.base.health <= 0:
@@ -2079,20 +2522,59 @@ class RaiderEnvironment():
         #        (0 == sum([max(0, p.health) for p in self.players[:self.teams[0]]])) or (0 == sum([max(0, p.health) for p in self.players[self.teams[0]:]])))
 
     
-    def getInputs(self, id_):
-        scale = 0.25
-        h, w = int(self.map_size[0] * scale), int(self.map_size[1] * scale)
-        small_surface = pygame.transform.scale(self.surface, (w, h))
-        np_surface = pygame.surfarray.pixels3d(small_surface)
+    def updateImageBuffer(self):
+        # downscale the map once per render into a padded buffer that every player's view is sliced from
+        if not self.image_buffer_stale:
+            return
+        self.image_buffer_stale = False
+        pygame.transform.scale(self.surface, self.small_surface.get_size(), self.small_surface)
+        w, h = self.small_surface.get_size()
+        pad = self.image_obs_size
+        pixels = pygame.surfarray.pixels3d(self.small_surface)
+        self.image_buffer[pad:pad+w, pad:pad+h] = pixels
+        del pixels
+
+    def getImageObs(self, id_):
+        # renders lazily, so headless environments only pay for drawing when an image is requested.
+        # the returned array is a view into a shared buffer that is overwritten on the next render,
+        # copy it if it needs to outlive the current step
+        self.render()
+        self.updateImageBuffer()
 
         player = self.players[id_]
+        size = self.image_obs_size
+        x, y = int(player.pos[0]*self.image_obs_scale), int(player.pos[1]*self.image_obs_scale)
+        x = max(-size, min(x, self.small_surface.get_width()))
+        y = max(-size, min(y, self.small_surface.get_height()))
+        return self.image_buffer[x+size:x+2*size, y+size:y+2*size]
+
+    def getObservations(self):
+        if self.obs_mode == "tensor":
+            batch = self.obs_encoder.encode(self, list(self.players))
 
-        x, y = int(player.pos[0]*scale), int(player.pos[1]*scale)
-        w, h = int(600*scale), int(600*scale)
-        x, y, w, h = [int(_) for _ in [x,y,w,h]]
-        obs = np_surface[x:x+w , y:y+h]
+        observations = {}
+        info = {"team_observations": {"defender": {}, "raider": {}} }
+        if self.obs_mode is None:
+            return observations, AttrDict(info)
+        for i, (id_, player) in enumerate(self.players.items()):
+            team = "defender" if player.team==1 else "raider"
+            if self.obs_mode == "tensor":
+                obs = AttrDict({
+                    "metadata": self.metadata,
+                    "image_obs": self.getImageObs(id_) if self.render_mode is not None else None,
+                    "vector_obs": batch.vector_obs[i],
+                    "entities": batch.entities[i],
+                    "mask": batch.mask[i],
+                })
+            else:
+                obs = self.getInputs(id_)
+            info["team_observations"][team][id_] = obs
+            observations[id_] = obs
+        info = AttrDict(info)
+        return observations, info
 
-        vec_obs = np.array([
+    def getVectorObs(self, player):
+        return np.array([
             (player.team),
             (max(0,player.health)**0.5)/5,
             (max(0,player.food)**0.5)/20,
@@ -2100,17 +2582,23 @@ class RaiderEnvironment():
             (max(0,player.stone)**0.5)/20,
         ], dtype=np.float32)
 
+    def getInputs(self, id_):
+        player = self.players[id_]
+
+        # image observations are skipped when headless, use getImageObs to request one
+        obs = self.getImageObs(id_) if self.render_mode is not None else None
+
         info = AttrDict({
             "metadata": self.metadata,
             "image_obs": obs,
-            "vector_obs": vec_obs,
+            "vector_obs": self.getVectorObs(player),
         })
 
         for type in ("base", "spike", "stonewall", "woodwall", "turret", "stone", "tree", "bush", "explosion", "frag", "bullet", "chargedarrow", "arrow", "heal", "player"):
             info[type] = []
 
         info["self"] = player.getInfo()
-        objects = self.grid.getNearbyObjects(player.pos, size=2) + self.dynamic_objects + self.effects
+        objects = chain(self.grid.iterNearbyObjects(player.pos, size=2, dynamic=True), self.effects)
         for obj in objects:
             dx, dy = obj.pos[0]-player.pos[0], obj.pos[1]-player.pos[1]
             if abs(dx) > 320 or abs(dy) > 320:
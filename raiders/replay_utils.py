@@ -0,0 +1,358 @@
+'''
+Replay file layout, all integers are unsigned LEB128 varints unless noted:
+
+    header: MAGIC, format version (u16), compression (u8), then the compressed event stream
+    events: a tag byte followed by its fields
+        RESET:  has_seed (u8), then the zigzag seed, or the Python random state of the env
+                (state version, 625 words, has_gauss (u8) and gauss (f64) if set)
+        ADD:    player id, team (u8, 1 defender 2 raider), name length + 1 (0 for no name), utf-8 name
+        REMOVE: player id
+        STEP:   number of changed players, then for each one the id delta from the previous one
+                and its action code. players whose action did not change since the last step are
+                left out, ABSENT_CODE marks a player that was not in the action dict
+        END
+
+An action [ax, ay, active, attack, angle] is packed into a single code below ACTION_CODES.
+'''
+
+import lzma
+import struct
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+from raiders import RaiderEnvironment
+
+
+MAGIC = b"RAIDREPL"
+VERSION = 1
+NO_COMPRESSION, LZMA, ZSTD = 0, 1, 2
+
+RESET, ADD, REMOVE, STEP, END = range(5)
+
+ACTION_RANGES = (3, 3, 10, 2, 5)
+ACTION_CODES = 3*3*10*2*5
+ABSENT_CODE = ACTION_CODES
+
+
+def encodeAction(action):
+    if len(action) != len(ACTION_RANGES):
+        raise ValueError(f"Invalid action: {action}")
+    code = 0
+    for value, size in zip(reversed(action), reversed(ACTION_RANGES)):
+        if not (0 <= value < size and int(value) == value):
+            raise ValueError(f"Invalid action: {action}")
+        code = code*size + int(value)
+    return code
+
+def decodeAction(code):
+    action = []
+    for size in ACTION_RANGES:
+        code, value = divmod(code, size)
+        action.append(value)
+    return action
+
+def writeVarint(buf, n):
+    while n >= 0x80:
+        buf.append((n & 0x7f) | 0x80)
+        n >>= 7
+    buf.append(n)
+
+def readVarint(data, pos):
+    n = shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        n |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return n, pos
+        shift += 7
+
+def zigzag(n):
+    return 2*n if n >= 0 else -2*n-1
+
+def unzigzag(n):
+    return n//2 if n % 2 == 0 else -(n+1)//2
+
+
+class ReplayRecorder():
+    '''
+    Records a game as its seed plus the actions of every step, see the layout above.
+
+    recorder = ReplayRecorder()
+    recorder.attach(env)    # recording starts at the next env.reset
+    ...
+    recorder.save("match.replay")
+
+    Replays depend on the game being deterministic given its random state and actions, so they
+    only play back correctly on the version of the game they were recorded with.
+
+    env.setState jumps to a game the replay has no record of, so recording pauses there and picks
+    up again at the next env.reset. Steps in between are not recorded.
+    '''
+
+    def __init__(self, compression=None):
+        if compression is None:
+            compression = ZSTD if zstandard is not None else LZMA
+        if compression == ZSTD and zstandard is None:
+            raise ValueError("zstd compression needs the zstandard package")
+        self.compression = compression
+        self.env = None
+        self.buf = bytearray()
+        self.recording = False
+        self.last_actions = {}
+        self.roster = {}
+        self.steps = 0
+
+    def attach(self, env):
+        assert env.recorder is None, "env already has a recorder"
+        self.env = env
+        env.recorder = self
+        for id_, player in env.players.items():
+            self.recordAddPlayer(id_, player.team, getattr(player, "name", None))
+
+    def detach(self):
+        if self.env is not None:
+            self.env.recorder = None
+            self.env = None
+
+    def recordReset(self, env, seed):
+        self.recording = True
+        self.last_actions = {}
+        self.buf.append(RESET)
+        if seed is not None:
+            self.buf.append(1)
+            writeVarint(self.buf, zigzag(seed))
+        else:
+            # unseeded resets carry on from the current generator, keep its whole state
+            version, words, gauss = env.rng.getstate()
+            self.buf.append(0)
+            writeVarint(self.buf, version)
+            for word in words:
+                writeVarint(self.buf, word)
+            self.buf.append(gauss is not None)
+            if gauss is not None:
+                self.buf += struct.pack("<d", gauss)
+
+    def recordAddPlayer(self, id_, team, name=None):
+        self.roster[id_] = team
+        self.buf.append(ADD)
+        writeVarint(self.buf, id_)
+        self.buf.append(team)
+        if name is None:
+            writeVarint(self.buf, 0)
+        else:
+            name = name.encode("utf-8")
+            writeVarint(self.buf, len(name)+1)
+            self.buf += name
+
+    def recordRemovePlayer(self, id_):
+        self.roster.pop(id_, None)
+        self.buf.append(REMOVE)
+        writeVarint(self.buf, id_)
+        self.last_actions.pop(id_, None)
+
+    def recordSetState(self, env):
+        # the snapshot may have a different roster, keep the replayed one in line for the next reset
+        self.recording = False
+        for id_ in [id_ for id_ in self.roster if id_ not in env.players]:
+            self.recordRemovePlayer(id_)
+        for id_, player in env.players.items():
+            if self.roster.get(id_) != player.team:
+                if id_ in self.roster:
+                    self.recordRemovePlayer(id_)
+                self.recordAddPlayer(id_, player.team, player.name)
+
+    def recordStep(self, env, actions):
+        if not self.recording:
+            return
+        # encodeAction raises on out of range actions before anything is written
+        codes = {id_: encodeAction(action) for id_, action in actions.items()}
+        for id_ in self.last_actions:
+            if id_ not in codes:
+                codes[id_] = ABSENT_CODE
+        changed = sorted(id_ for id_, code in codes.items() if self.last_actions.get(id_) != code)
+
+        self.buf.append(STEP)
+        writeVarint(self.buf, len(changed))
+        prev = 0
+        for id_ in changed:
+            writeVarint(self.buf, id_-prev)
+            writeVarint(self.buf, codes[id_])
+            prev = id_
+        self.last_actions = {id_: code for id_, code in codes.items() if code != ABSENT_CODE}
+        self.steps += 1
+
+    def getBytes(self):
+        body = bytes(self.buf) + bytes((END,))
+        if self.compression == ZSTD:
+            body = zstandard.ZstdCompressor(level=19).compress(body)
+        elif self.compression == LZMA:
+            body = lzma.compress(body, preset=9)
+        return MAGIC + struct.pack("<HB", VERSION, self.compression) + body
+
+    def save(self, path):
+        with open(path, "wb") as f:
+            f.write(self.getBytes())
+
+
+def parseReplay(data):
+    # returns the list of events as (tag, fields) tuples, STEP fields are the full action dict
+    if data[:len(MAGIC)] != MAGIC:
+        raise ValueError("Not a replay file")
+    version, compression = struct.unpack_from("<HB", data, len(MAGIC))
+    if version != VERSION:
+        raise ValueError(f"Unsupported replay version: {version}")
+    body = data[len(MAGIC)+3:]
+    if compression == ZSTD:
+        if zstandard is None:
+            raise ValueError("Replay is zstd compressed, install the zstandard package to read it")
+        body = zstandard.ZstdDecompressor().decompress(body)
+    elif compression == LZMA:
+        body = lzma.decompress(body)
+
+    events = []
+    actions = {}
+    pos = 0
+    while True:
+        tag = body[pos]
+        pos += 1
+        if tag == END:
+            return events
+        elif tag == RESET:
+            has_seed = body[pos]
+            pos += 1
+            if has_seed:
+                seed, pos = readVarint(body, pos)
+                events.append((RESET, unzigzag(seed), None))
+            else:
+                version, pos = readVarint(body, pos)
+                words = []
+                for _ in range(625):
+                    word, pos = readVarint(body, pos)
+                    words.append(word)
+                gauss = None
+                if body[pos]:
+                    gauss, = struct.unpack_from("<d", body, pos+1)
+                    pos += 8
+                pos += 1
+                events.append((RESET, None, (version, tuple(words), gauss)))
+            actions = {}
+        elif tag == ADD:
+            id_, pos = readVarint(body, pos)
+            team = body[pos]
+            length, pos = readVarint(body, pos+1)
+            name = None
+            if length:
+                name = bytes(body[pos:pos+length-1]).decode("utf-8")
+                pos += length-1
+            events.append((ADD, id_, team, name))
+        elif tag == REMOVE:
+            id_, pos = readVarint(body, pos)
+            actions.pop(id_, None)
+            events.append((REMOVE, id_))
+        elif tag == STEP:
+            count, pos = readVarint(body, pos)
+            id_ = 0
+            for _ in range(count):
+                delta, pos = readVarint(body, pos)
+                code, pos = readVarint(body, pos)
+                id_ += delta
+                if code == ABSENT_CODE:
+                    actions.pop(id_, None)
+                else:
+                    actions[id_] = decodeAction(code)
+            events.append((STEP, dict(actions)))
+        else:
+            raise ValueError(f"Corrupt replay, unknown event tag {tag}")
+
+
+class ReplayPlayer():
+    '''
+    Re-simulates a recorded game, headless by default so it runs as fast as the game logic allows.
+
+    player = ReplayPlayer("match.replay")
+    player.play()          # run to the end
+    player.seek(1200)      # jump to step 1200 of the recording, env is the game at that point
+    player.env.render()
+
+    tick counts the steps replayed since the start of the recording, across resets. A snapshot of
+    the game (RaiderEnvironment.getState) is kept every snapshot_interval steps as they are played,
+    so seeking only re-simulates from the closest snapshot before the target.
+    '''
+
+    def __init__(self, source, render_mode=None, snapshot_interval=200):
+        if isinstance(source, (bytes, bytearray)):
+            data = source
+        else:
+            with open(source, "rb") as f:
+                data = f.read()
+        self.events = parseReplay(data)
+        self.num_steps = sum(event[0] == STEP for event in self.events)
+        self.env = RaiderEnvironment(render_mode=render_mode)
+        self.snapshot_interval = snapshot_interval
+        self.snapshots = {}
+        self.restart()
+
+    def __len__(self):
+        return self.num_steps
+
+    def restart(self):
+        for id_ in list(self.env.players):
+            self.env.removePlayer(id_)
+        self.position = 0
+        self.tick = 0
+        self.result = None
+
+    def applyEvent(self, event):
+        tag = event[0]
+        if tag == RESET:
+            _, seed, state = event
+            if state is not None:
+                self.env.rng.setstate(state)
+            self.env.reset(seed=seed)
+        elif tag == ADD:
+            _, id_, team, name = event
+            self.env.addPlayer(id_, "defender" if team == 1 else "raider", name)
+        elif tag == REMOVE:
+            self.env.removePlayer(event[1])
+        elif tag == STEP:
+            self.result = self.env.step(event[1])
+            self.tick += 1
+            if self.snapshot_interval and self.tick % self.snapshot_interval == 0 and self.tick not in self.snapshots:
+                self.snapshots[self.tick] = (self.position, self.env.getState())
+
+    def advance(self):
+        # apply events up to and including the next step, returns False at the end of the replay
+        while self.position < len(self.events):
+            event = self.events[self.position]
+            self.position += 1
+            self.applyEvent(event)
+            if event[0] == STEP:
+                return True
+        return False
+
+    def play(self, steps=None):
+        count = 0
+        while (steps is None or count < steps) and self.advance():
+            count += 1
+        return count
+
+    def restoreSnapshot(self, tick):
+        position, state = self.snapshots[tick]
+        self.env.setState(state)
+        self.position = position
+        self.tick = tick
+        self.result = None
+
+    def seek(self, tick):
+        tick = max(0, min(tick, self.num_steps))
+        closest = max((t for t in self.snapshots if t <= tick), default=None)
+        if closest is not None and (tick < self.tick or closest > self.tick):
+            self.restoreSnapshot(closest)
+        elif tick < self.tick:
+            self.restart()
+        self.play(tick - self.tick)
+        return self.env
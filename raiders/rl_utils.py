@@ -9,17 +9,20 @@ import math, time
 from enum import Enum
 
 from raiders import RaiderEnvironment
+import env_utils
 from sound_utils import SoundUtils
 from agents.base_agent import BaseAgent
 from agents.player_agent import PlayerAgent
 
-class RaiderEnvironmentWrapper():
+# scripts and agents are registered the same way as in env_utils, only training differs
+class RaiderEnvironmentWrapper(env_utils.RaiderEnvironmentWrapper):
     def __init__(
         self,
-        mode = "god"
+        mode = "god",
+        render_mode = "human"
     ):
         self.mode = mode
-        self.env = RaiderEnvironment()
+        self.env = RaiderEnvironment(render_mode=render_mode)
 
         self.food_img = pygame.image.load("assets/food.png")
         self.wood_img = pygame.image.load("assets/wood.png")
@@ -38,9 +41,13 @@ class RaiderEnvironmentWrapper():
 
         self.reset()
 
-    def reset(self):
+    def reset(self, seed=None):
+        # a seed fixes the map, spawns and agent scripts, script i is seeded with seed+i+1
         self.actions = {id_: [1, 1, 0, 0, 2] for id_ in self.env.players.keys()}
-        observations, info = self.env.reset()
+        if seed is not None:
+            for i, script in enumerate(self.scripts):
+                script.seed(seed+i+1)
+        observations, info = self.env.reset(seed=seed)
 
         for script in self.scripts:
             team = script.__team__
@@ -65,7 +72,7 @@ class RaiderEnvironmentWrapper():
             action = script.getAction(observations[id_], id_)
             self.actions[id_] = action
         
-        if self.mode == "god":
+        if self.mode == "god" and self.env.screen is not None:
             self.cameraControl()
 
         if display:
@@ -74,6 +81,8 @@ class RaiderEnvironmentWrapper():
         return observations, rewards, terminated, truncated, info
     
     def display(self, player_id, sounds, debug):
+        self.env.render()
+        self.env.initializeDisplay()
         old_camera_scale = self.env.camera.scale
         old_camera_center = self.env.camera.frame_rect.center
 
@@ -2,8 +2,13 @@ import pygame
 import random
 import os
 
-pygame.mixer.init()
-pygame.mixer.set_num_channels(32)  # allow many sounds
+try:
+    pygame.mixer.init()
+    pygame.mixer.set_num_channels(32)  # allow many sounds
+    AUDIO = True
+except pygame.error:
+    # headless servers have no audio device, sound ids are still needed by the environment
+    AUDIO = False
 
 assets_folder = "assets/sounds"
 sound_files = [f for f in os.listdir(assets_folder) if f.endswith((".ogg"))]
@@ -28,7 +33,8 @@ for file in sound_files:
         SOUNDS_TO_IDX[sound] = idx
         IDX_TO_SOUND[idx] = sound
         idx += 1
-    SOUNDS[sound].append(pygame.mixer.Sound(os.path.join(assets_folder, f)))
+    if AUDIO:
+        SOUNDS[sound].append(pygame.mixer.Sound(os.path.join(assets_folder, f)))
 
 class SoundUtils:
 
@@ -37,13 +43,15 @@ class SoundUtils:
         return SOUNDS_TO_IDX[sound]
 
     @staticmethod
-    def decodeSoundID(sound_id):
+    def decodeSoundID(sound_id, rng=random):
         sound = IDX_TO_SOUND[sound_id]
-        return random.choice(SOUNDS[sound])
+        return rng.choice(SOUNDS[sound])
 
     @staticmethod
-    def playSound(sound_id, dist, scale):
-        sound = SoundUtils.decodeSoundID(sound_id)
+    def playSound(sound_id, dist, scale, rng=random):
+        if not AUDIO:
+            return
+        sound = SoundUtils.decodeSoundID(sound_id, rng)
         channel = sound.play()
         if channel:  # if a free channel was available
             volume = scale * max(0, min(1, 1 - 0.5*dist/300))
@@ -0,0 +1,96 @@
+import functools, hashlib, json, math, os, struct, zlib
+
+import numpy as np
+import pygame
+
+
+# bump when the sprite drawing code changes, so atlases drawn by the old code are not picked up
+ATLAS_VERSION = 1
+
+HEADER_LEN_STRUCT = struct.Struct("!I")
+
+
+def toOpaque(surface):
+    # convert() needs a video mode, fall back to a plain 32 bit surface when running headless
+    if pygame.display.get_surface() is None:
+        return surface.convert(32, 0)
+    return surface.convert()
+
+def atlasPath(params, folder="assets_cache"):
+    '''
+    where the atlas drawn from params lives, the file name is a hash of everything the sprites depend on
+    '''
+    digest = hashlib.sha1(repr((ATLAS_VERSION, params)).encode()).hexdigest()[:16]
+    return os.path.join(folder, f"atlas_{digest}.bin")
+
+def saveAtlas(path, sprites):
+    '''
+    packs the sprites with tuple keys ((type, health, hit) or (type, hit)) into one RGB image on a grid,
+    compressed and written after a header holding the image size and the rect of every sprite
+    '''
+    keys = [key for key in sprites if isinstance(key, tuple)]
+    cell_w = max(sprites[key].get_width() for key in keys)
+    cell_h = max(sprites[key].get_height() for key in keys)
+    cols = math.ceil(math.sqrt(len(keys)))
+    rows = -(-len(keys) // cols)
+
+    pixels = np.zeros((rows*cell_h, cols*cell_w, 3), dtype=np.uint8)
+    index = []
+    for i, key in enumerate(keys):
+        surf = sprites[key]
+        w, h = surf.get_size()
+        x, y = (i % cols) * cell_w, (i // cols) * cell_h
+        pixels[y:y+h, x:x+w] = np.frombuffer(pygame.image.tostring(surf, "RGB"), dtype=np.uint8).reshape(h, w, 3)
+        index.append([list(key), [x, y, w, h]])
+
+    header = json.dumps({"size": [cols*cell_w, rows*cell_h], "sprites": index}).encode()
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    # other processes may be loading the same atlas, only ever show them a complete file
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(HEADER_LEN_STRUCT.pack(len(header)) + header + zlib.compress(pixels.tobytes()))
+    os.replace(tmp_path, path)
+
+def loadAtlas(path):
+    '''
+    reads an atlas written by saveAtlas, returns {key: sprite} with black as the colorkey or None if there is none
+    '''
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+    except FileNotFoundError:
+        return None
+
+    offset = HEADER_LEN_STRUCT.size
+    header_len, = HEADER_LEN_STRUCT.unpack_from(data)
+    header = json.loads(data[offset:offset+header_len])
+    pixels = zlib.decompress(data[offset+header_len:])
+    atlas = toOpaque(pygame.image.frombuffer(pixels, header["size"], "RGB"))
+
+    sprites = {}
+    for key, rect in header["sprites"]:
+        sprite = atlas.subsurface(rect)
+        sprite.set_colorkey((0, 0, 0))
+        sprites[tuple(key)] = sprite
+    return sprites
+
+
+# actions turn players by multiples of this many radians, so only a few distinct rotations are ever drawn
+ANGLE_STEP = 0.0981747704247
+ANGLE_STEPS = round(2*math.pi / ANGLE_STEP)
+# a turned weapon is up to ~115 KB, this keeps the cache to a few tens of MB per process
+ROTATION_CACHE_SIZE = 256
+
+@functools.lru_cache(maxsize=ROTATION_CACHE_SIZE)
+def rotatedSprite(sprite, steps, offset, highlight):
+    rotated = pygame.transform.rotate(sprite, -(steps*ANGLE_STEP)/math.pi*180-offset)
+    if highlight:
+        rotated.fill((100, 100, 100, 0), special_flags=pygame.BLEND_RGBA_ADD)
+    return rotated
+
+def rotateSprite(sprite, angle, offset=0, highlight=False):
+    '''
+    sprite turned to angle (radians, snapped to ANGLE_STEP) and a further offset in degrees, brightened when
+    highlight is set. the results are shared, blit them but never draw onto them
+    '''
+    return rotatedSprite(sprite, round(angle / ANGLE_STEP) % ANGLE_STEPS, offset, bool(highlight))
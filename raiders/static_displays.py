@@ -1,7 +1,9 @@
 import pygame
 import numpy as np
 import math
-import os
+
+from raiders import loadImages, spriteParameters
+from sprite_atlas import atlasPath, loadAtlas, rotateSprite
 
 pygame.init()
 pygame.display.set_mode((1, 1))  # Minimal dummy window
@@ -22,38 +24,8 @@ def polygon(center, radius, n, flip=1):
         points.append((x+cx, y+cy))
     return points
 
-def cast(value: str):
-    value = value.strip()
-
-    # Try boolean first
-    if value.lower() == 'true':
-        return True
-    elif value.lower() == 'false':
-        return False
-
-    # Try integer
-    try:
-        return int(value)
-    except ValueError:
-        return value  # Return original string if no match
-        
-cache_folder = "assets_cache"
-
-image_files = [f for f in os.listdir(cache_folder) if f.endswith((".png", ".jpg", ".jpeg"))]
-keys = [tuple(cast(v) for v in info[:-4].split('_')) for info in image_files]
-
-sprites = {
-    "raider": pygame.image.load("assets/raider.png"),
-    "defender": pygame.image.load("assets/defender.png"),
-    "sword": pygame.image.load("assets/sword.png"),
-    "bow": pygame.image.load("assets/bow.png"),
-    "axe": pygame.image.load("assets/axe.png"),
-    "arrow": pygame.image.load("assets/arrow.png"),
-}
-for key, path in zip(keys, image_files):
-    surf = pygame.image.load(os.path.join(cache_folder, path)).convert()
-    surf.set_colorkey((0,0,0))
-    sprites[key] = surf
+sprites = loadImages()
+sprites.update(loadAtlas(atlasPath(spriteParameters())) or {})
 
 
 class StaticDisplays:
@@ -172,14 +144,12 @@ class StaticDisplays:
                     else:
                         scale = (frames[0] - attack_tick) / (frames[0]-frames[1]-anticipation)
                         attack_offset = rest*(1-scale) + windup*scale
-                rotated_image = pygame.transform.rotate(StaticDisplays.sprites["sword"], -(angle)/math.pi*180-attack_offset)
-                if frames[2] < attack_tick < frames[1]+anticipation:
-                    rotated_image.fill((100, 100, 100, 0), special_flags=pygame.BLEND_RGBA_ADD)
+                rotated_image = rotateSprite(StaticDisplays.sprites["sword"], angle, attack_offset, frames[2] < attack_tick < frames[1]+anticipation)
                 image_rect = rotated_image.get_rect()
                 image_rect.center = pos
                 surface.blit(rotated_image, image_rect)
             case 2:
-                rotated_image = pygame.transform.rotate(StaticDisplays.sprites["bow"], -(angle)/math.pi*180)
+                rotated_image = rotateSprite(StaticDisplays.sprites["bow"], angle)
                 image_rect = rotated_image.get_rect()
                 image_rect.center = pos
                 surface.blit(rotated_image, image_rect)
@@ -195,9 +165,7 @@ class StaticDisplays:
                     else:
                         scale = (frames[0] - attack_tick) / (frames[0]-frames[1]-anticipation)
                         attack_offset = rest*(1-scale) + windup*scale
-                rotated_image = pygame.transform.rotate(StaticDisplays.sprites["axe"], -(angle)/math.pi*180-attack_offset)
-                if frames[2] < attack_tick < frames[1]+anticipation:
-                    rotated_image.fill((100, 100, 100, 0), special_flags=pygame.BLEND_RGBA_ADD)
+                rotated_image = rotateSprite(StaticDisplays.sprites["axe"], angle, attack_offset, frames[2] < attack_tick < frames[1]+anticipation)
                 image_rect = rotated_image.get_rect()
                 image_rect.center = pos
                 surface.blit(rotated_image, image_rect)
@@ -340,7 +308,7 @@ class StaticDisplays:
     def Arrow_staticDisplay(surface, pos, info):
         x, y = pos
         _, _, _, health, angle, hit, r, g, b = info
-        rotated_image = pygame.transform.rotate(StaticDisplays.sprites["arrow"], -(angle)/math.pi*180)
+        rotated_image = rotateSprite(StaticDisplays.sprites["arrow"], angle)
         image_rect = rotated_image.get_rect()
         image_rect.center = pos
         surface.blit(rotated_image, image_rect)
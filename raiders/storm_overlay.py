@@ -0,0 +1,51 @@
+import math
+
+import pygame
+
+
+class StormOverlay():
+    '''
+    Tints everything outside the storm circle, for the env renderer and game_client.
+
+    Gives the same pixels as blitting a freshly filled mask with a transparent circle cut out, but
+    the mask is kept between calls and only redrawn when the surface size, center or radius
+    change, and only the parts of the surface outside the circle are blended: rows are handled in
+    bands and the middle of each band, which the circle covers, is skipped.
+    '''
+
+    def __init__(self, color=(255, 0, 0, 120), band_height=16):
+        self.color = color
+        self.band_height = band_height
+        self.mask = None
+        self.key = None
+
+    def getMask(self, size, center, radius):
+        key = (size, tuple(center), radius)
+        if key != self.key:
+            if self.mask is None or self.mask.get_size() != size:
+                self.mask = pygame.Surface(size, pygame.SRCALPHA)
+            self.mask.fill(self.color)
+            pygame.draw.circle(self.mask, (0, 0, 0, 0), center, radius)
+            self.key = key
+        return self.mask
+
+    def draw(self, surface, center, radius):
+        width, height = surface.get_size()
+        mask = self.getMask((width, height), center, radius)
+        cx, cy = center
+        # fully transparent pixels of the mask leave the surface as is, so blending fewer of them changes nothing
+        for y0 in range(0, height, self.band_height):
+            y1 = min(y0 + self.band_height, height)
+            # shrink the circle by a pixel to allow for how it is rasterized
+            far = max(abs(y0 - cy), abs(y1 - 1 - cy)) + 1
+            inner = radius - 1
+            if far >= inner:
+                surface.blit(mask, (0, y0), (0, y0, width, y1 - y0))
+                continue
+            chord = math.sqrt(inner*inner - far*far) - 1
+            left = max(0, min(width, int(cx - chord)))
+            right = max(0, min(width, int(cx + chord) + 1))
+            if left > 0:
+                surface.blit(mask, (0, y0), (0, y0, left, y1 - y0))
+            if right < width:
+                surface.blit(mask, (right, y0), (right, y0, width - right, y1 - y0))
@@ -0,0 +1,31 @@
+import os, sys
+
+# the game loads assets relative to the raiders folder and imports its modules flat
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+import pytest
+
+
+def fingerprintEnv(env):
+    # everything that can differ between two runs of a game, rounded so it compares exactly
+    objects = [
+        (type(obj).__name__, tuple(round(float(v), 6) for v in obj.pos), getattr(obj, "health", None))
+        for obj in env.objects + env.dynamic_objects + env.effects
+    ]
+    players = [(id_, p.team, p.food, p.wood, p.stone, p.kills, round(p.angle, 9)) for id_, p in sorted(env.players.items())]
+    return env.t, objects, players, env.rng.getstate()
+
+@pytest.fixture
+def fingerprint():
+    return fingerprintEnv
+
+def randomActions(rng, ids):
+    return {id_: [rng.randint(0, 2), rng.randint(0, 2), rng.randint(0, 9), rng.randint(0, 1), rng.randint(0, 4)] for id_ in ids}
+
+@pytest.fixture
+def random_actions():
+    return randomActions
@@ -0,0 +1,73 @@
+import math
+import random
+
+import numpy as np
+
+from raiders import RaiderEnvironment
+from entity_store import EntityStore, ID_TO_KIND
+
+
+def makeEnv(random_actions, steps=60, seed=2):
+    env = RaiderEnvironment(render_mode=None, obs_mode=None, entity_store=True)
+    for id_, team in ((1, "defender"), (2, "defender"), (3, "raider"), (4, "raider")):
+        env.addPlayer(id_, team)
+    env.reset(seed=seed)
+    rng = random.Random(seed)
+    for _ in range(steps):
+        env.step(random_actions(rng, env.players))
+    return env
+
+def test_store_mirrors_objects(random_actions):
+    env = makeEnv(random_actions)
+    store = env.entities
+    objects = env.objects + env.dynamic_objects + env.effects
+    slots = store.slots()
+    assert sorted(id(store.view(slot)) for slot in slots) == sorted(id(obj) for obj in objects)
+    for obj in objects:
+        assert store.view(obj.slot) is obj
+        assert ID_TO_KIND[store.type_id[obj.slot]] == obj.kind
+        np.testing.assert_array_equal(store.pos[obj.slot], obj.pos)
+        assert store.health[obj.slot] == getattr(obj, "health", 0)
+
+def test_queries_match_brute_force(random_actions):
+    env = makeEnv(random_actions)
+    store = env.entities
+    objects = env.objects + env.dynamic_objects + env.effects
+    rng = random.Random(0)
+    for _ in range(20):
+        pos = (rng.uniform(0, 2000), rng.uniform(0, 2000))
+        radius = rng.uniform(50, 600)
+        expected = {id(obj) for obj in objects if math.dist(obj.pos, pos) <= radius}
+        assert {id(store.view(slot)) for slot in store.queryRadius(pos, radius)} == expected
+        expected = {id(obj) for obj in objects if abs(obj.pos[0]-pos[0]) <= radius and abs(obj.pos[1]-pos[1]) <= radius}
+        assert {id(store.view(slot)) for slot in store.queryBox(pos, radius)} == expected
+        expected = {id(obj) for obj in env.getPlayers() if math.dist(obj.pos, pos) <= radius}
+        assert {id(store.view(slot)) for slot in store.queryRadius(pos, radius, kinds=("player",))} == expected
+
+def test_slots_are_reused_and_grown():
+    class Thing():
+        kind = "arrow"
+        def __init__(self, i):
+            self.pos, self.size, self.slot = (i, i), 1, -1
+
+    store = EntityStore(capacity=2)
+    things = [Thing(i) for i in range(5)]
+    for thing in things:
+        store.add(thing)
+    assert store.capacity >= 5 and sorted(thing.slot for thing in things) == list(range(5))
+    store.remove(things[1])
+    assert things[1].slot == -1 and store.view(1) is None
+    extra = Thing(9)
+    assert store.add(extra) == 1
+    assert len(store.slots(("arrow",))) == 5
+
+def test_store_does_not_change_the_game(random_actions, fingerprint):
+    env = makeEnv(random_actions)
+    plain = RaiderEnvironment(render_mode=None, obs_mode=None)
+    for id_, team in ((1, "defender"), (2, "defender"), (3, "raider"), (4, "raider")):
+        plain.addPlayer(id_, team)
+    plain.reset(seed=2)
+    rng = random.Random(2)
+    for _ in range(60):
+        plain.step(random_actions(rng, plain.players))
+    assert fingerprint(plain) == fingerprint(env)
@@ -0,0 +1,69 @@
+import math
+import random
+
+from raiders import RaiderEnvironment
+
+
+def makeEnv(random_actions, steps=80, seed=4):
+    env = RaiderEnvironment(render_mode=None, obs_mode=None)
+    for id_, team in ((1, "defender"), (2, "defender"), (3, "raider"), (4, "raider")):
+        env.addPlayer(id_, team)
+    env.reset(seed=seed)
+    rng = random.Random(seed)
+    for _ in range(steps):
+        env.step(random_actions(rng, env.players))
+    return env
+
+def test_dynamic_objects_are_filed(random_actions):
+    env = makeEnv(random_actions)
+    grid = env.grid
+    grid.updateDynamicObjects()
+    filed = [obj for cell in grid.grid.values() for obj in cell.dynamic_objects]
+    assert sorted(map(id, filed)) == sorted(map(id, env.dynamic_objects))
+    for obj in env.dynamic_objects:
+        assert obj.grid_cell is grid.getDynamicCell(obj.pos)
+        assert obj in obj.grid_cell.dynamic_objects
+
+def test_neighborhood_covers_a_cell(random_actions):
+    env = makeEnv(random_actions)
+    grid = env.grid
+    grid.updateDynamicObjects()
+    for obj in env.dynamic_objects:
+        nearby = {id(other) for other in grid.getNearbyDynamicObjects(obj.pos)}
+        for other in env.dynamic_objects:
+            if math.dist(obj.pos, other.pos) < grid.gridsize:
+                assert id(other) in nearby
+
+def nearbyReference(grid, env, pos, size):
+    # what the queries returned before the neighborhood tables: static objects cell by cell, then
+    # the dynamic objects of those cells in env.dynamic_objects order
+    idx = int(pos[0]//grid.gridsize), int(pos[1]//grid.gridsize)
+    cells = [cell for cell in grid.getNeighboringCells(idx, size) if cell is not grid.DUMMYCELL]
+    static = [obj for cell in cells for obj in cell.objects]
+    dynamic = [obj for obj in env.dynamic_objects if any(obj.grid_cell is cell for cell in cells)]
+    return static, dynamic
+
+def test_nearby_order_matches_reference(random_actions):
+    env = makeEnv(random_actions)
+    grid = env.grid
+    grid.updateDynamicObjects()
+    rng = random.Random(1)
+    points = [obj.pos for obj in env.dynamic_objects] + [(rng.uniform(0, 2000), rng.uniform(0, 2000)) for _ in range(30)]
+    for pos in points:
+        for size in (1, 2, 3):
+            static, dynamic = nearbyReference(grid, env, pos, size)
+            assert grid.getNearbyObjects(pos, size) == static
+            assert grid.getNearbyObjects(pos, size, dynamic=True) == static + dynamic
+            assert grid.getNearbyDynamicObjects(pos, size) == dynamic
+            kinds = {"player", "tree"}
+            assert grid.getNearbyObjects(pos, size, dynamic=True, kinds=kinds) == [obj for obj in static + dynamic if obj.kind in kinds]
+
+def test_order_survives_moves(random_actions):
+    # objects moving between cells are inserted back by sequence, keeping env.dynamic_objects order
+    env = makeEnv(random_actions, steps=200, seed=9)
+    grid = env.grid
+    grid.updateDynamicObjects()
+    for cell in grid.grid.values():
+        seqs = [obj.grid_seq for obj in cell.dynamic_objects]
+        assert seqs == sorted(seqs)
+    assert [obj.grid_seq for obj in env.dynamic_objects] == sorted(obj.grid_seq for obj in env.dynamic_objects)
@@ -0,0 +1,17 @@
+import pytest
+
+import env_utils, rl_utils
+from agents.lookahead_agent import LookaheadAgent
+
+
+@pytest.mark.parametrize("module", [env_utils, rl_utils])
+def test_wrappers_attach_environment(module):
+    wrapper = module.RaiderEnvironmentWrapper(render_mode=None)
+    defender, raider = LookaheadAgent(time_budget=0.01, horizon=2, samples=2), LookaheadAgent(time_budget=0.01, horizon=2, samples=2)
+    wrapper.loadAgentScripts([(defender, 1, "defender"), (raider, 1, "raider")])
+    assert defender.env is wrapper.env and raider.env is wrapper.env
+
+    wrapper.reset(seed=3)
+    for _ in range(3):
+        wrapper.step()
+    assert set(defender.actions) | set(raider.actions) <= set(wrapper.env.players)
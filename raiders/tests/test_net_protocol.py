@@ -0,0 +1,177 @@
+import asyncio
+import math
+import random
+import socket
+from types import SimpleNamespace
+
+import pytest
+
+import env_utils
+import game_server
+import net_protocol as proto
+
+
+# every value here is exact in float32, so frames decode to exactly what was sent
+PLAYER = (-1, 120.5, 80.25, 100.0, 1.5, 1, 140, 190, 240, 1, -3, (0, 2, -1), 7, 2)
+TREE = (8, 300.0, 410.0, 250.0, 0.0, 0, 0, 0, 0)
+ARROW = (1, 55.5, 60.0, 0.0, -0.75, 0, 0, 0, 0)
+
+def frameArgs(seq=5):
+    return dict(
+        seq=seq, map_size=(2000, 2000), size=(2000, 2000), timestamp=1234.5, storm_size=800.0,
+        ids=(7, 9), teams=(1, 1),
+        players=[(7, 100.0, 1.5, 120.5, 80.25, 10.0, 20.0, 30.0), (9, 50.0, 0.0, 10.0, 10.0, 0.0, 0.0, 0.0)],
+        names=["seven", "nine"], sounds=[(3, 100.0, 200.0, 0.5)],
+    )
+
+def test_small_messages_round_trip():
+    assert proto.decode_message(proto.encode_register("raider")) == {"type": "register", "team": "raider"}
+    assert proto.decode_message(proto.encode_register_ack(17, "defender")) == {"type": "register_ack", "player_id": 17, "team": "defender"}
+    assert proto.decode_message(proto.encode_shutdown()) == {"type": "server_shutdown"}
+    assert proto.decode_message(proto.encode_snapshot_request()) == {"type": "snapshot_request"}
+
+    msg = proto.decode_message(proto.encode_action(17, (2, 0, 1, True, 0.5), ack=42))
+    assert msg == {"type": "action", "player_id": 17, "action": (2, 0, 1, 1, 0.5), "ack": 42, "view_id": 17}
+    msg = proto.decode_message(proto.encode_action(17, (1, 1, 0, 0, -2.25), view_id=3, name="é" * 200))
+    assert msg["view_id"] == 3 and msg["action"] == (1, 1, 0, 0, -2.25)
+    # names are cut to 255 bytes, a cut through a character is replaced rather than failing
+    assert msg["name"] == "é" * 127 + "\ufffd"
+
+def test_frame_round_trip():
+    data = proto.encode_frame(0, [1, 2, 3], [PLAYER, TREE, ARROW], [], **frameArgs())
+    msg = proto.decode_message(data)
+    assert msg["type"] == "frame"
+    assert (msg["seq"], msg["baseline"], msg["object_ids"], msg["removed"]) == (5, 0, [1, 2, 3], [])
+    assert msg["ids"] == (7, 9) and msg["teams"] == (1, 1) and msg["timestamp"] == 1234.5
+    info = msg["info"]
+    assert info["objects"] == [PLAYER, TREE, ARROW]
+    assert info["names"] == {7: "seven", 9: "nine"}
+    assert info["positions"][7] == (120.5, 80.25) and info["wood"][7] == 20.0
+    assert info["sounds"] == [(3, 100.0, 200.0, 0.5)] and info["stormsize"] == 800.0
+
+def test_bad_messages_are_rejected():
+    data = proto.encode_shutdown()
+    with pytest.raises(ValueError):
+        proto.decode_message(bytes([proto.PROTOCOL_VERSION + 1]) + data[1:])
+    with pytest.raises(ValueError):
+        proto.decode_message(bytes([proto.PROTOCOL_VERSION, 99]))
+
+def randomStates(rng, frames):
+    # a world where objects appear, move, change and disappear
+    state, next_id = {}, 1
+    for _ in range(frames):
+        state = dict(state)
+        for id_ in rng.sample(sorted(state), min(len(state), rng.randint(0, 3))):
+            del state[id_]
+        for id_ in rng.sample(sorted(state), min(len(state), rng.randint(0, 6))):
+            state[id_] = state[id_][:1] + (float(rng.randint(0, 2000)),) + state[id_][2:]
+        for _ in range(rng.randint(0, 3)):
+            state[next_id] = rng.choice((PLAYER, TREE, ARROW))
+            next_id += 1
+        yield state
+
+def drawOrder(state):
+    return [state[id_] for id_ in sorted(state, key=lambda id_: (proto.DRAW_LAYERS.get(state[id_][0], 2), id_))]
+
+def test_deltas_rebuild_the_world():
+    rng = random.Random(0)
+    history = proto.SnapshotHistory()
+    mirror = proto.WorldMirror()
+    ack, keyframe, kinds = 0, 0, set()
+    for state in randomStates(rng, 600):
+        seq = history.push(state)
+        baseline = history.baseline(ack, keyframe)
+        if baseline == 0:
+            keyframe = seq
+        kinds.add("keyframe" if baseline == 0 else "delta")
+        object_ids, objects, removed = history.delta(baseline)
+        msg = proto.decode_message(proto.encode_frame(baseline, object_ids, objects, removed, **frameArgs(seq)))
+        # frames get lost on the way and acks arrive late
+        if rng.random() < 0.2:
+            continue
+        assert mirror.apply(msg) == drawOrder(state)
+        if rng.random() < 0.5:
+            ack = seq
+    assert kinds == {"keyframe", "delta"}
+    assert keyframe > proto.KEYFRAME_INTERVAL
+
+def test_baseline_falls_back_to_keyframes():
+    history = proto.SnapshotHistory(size=4)
+    for _ in range(10):
+        history.push({})
+    assert history.baseline(9, 8) == 9
+    # acked frames that fell out of the history, or too long without a keyframe
+    assert history.baseline(5, 8) == 0
+    assert history.baseline(9, history.seq - proto.KEYFRAME_INTERVAL) == 0
+
+def test_unknown_baseline_is_skipped():
+    mirror = proto.WorldMirror()
+    msg = proto.decode_message(proto.encode_frame(3, [1], [TREE], [], **frameArgs(4)))
+    assert mirror.apply(msg) is None
+    msg = proto.decode_message(proto.encode_frame(0, [1], [TREE], [], **frameArgs(5)))
+    assert mirror.apply(msg) == [TREE]
+
+def test_view_center_stays_on_the_map():
+    half = proto.VIEW_SIZE / 2
+    assert proto.view_center((1000, 1200), (2000, 2000)) == (1000, 1200)
+    assert proto.view_center((-50, 10), (2000, 2000)) == (half, half)
+    assert proto.view_center((1990, 2500), (2000, 2000)) == (2000 - half, 2000 - half)
+
+def test_clients_get_the_objects_in_view():
+    match = game_server.Match(0, [(env_utils.AgentScripts.BasicAgent(), 2, "defender"), (env_utils.AgentScripts.BasicAgent(), 3, "raider")])
+    env = match.env.env
+    player_id = match.add_player("raider")
+    # stands in for a ClientConnection, the match only reads and updates these
+    client = SimpleNamespace(player_id=player_id, view_id=player_id, action=None, name=None, ack=0, keyframe=0, interest={})
+    match.clients[player_id] = client
+    mirror = proto.WorldMirror()
+    for tick in range(150):
+        if tick == 75:
+            client.view_id = min(env.players)
+        (_, data), = match.tick()
+        msg = proto.decode_message(data)
+        client.ack = msg["seq"]
+
+        center = proto.view_center(env.players[client.view_id].pos, env.map_size)
+        visible = {net_id for obj, net_id in match.net_ids.items() if math.dist(obj.pos, center) <= proto.VIEW_RADIUS}
+        assert match.interest_set(client, env.map_size) == visible
+        # positions arrive as float32, comparing ids and types is enough here
+        objects = mirror.apply(msg)
+        state = match.history.states[msg["seq"]]
+        assert set(mirror.states[msg["seq"]]) == visible
+        assert [obj[0] for obj in objects] == [obj[0] for obj in drawOrder({id_: state[id_] for id_ in visible})]
+
+def test_shared_part_is_encoded_once():
+    shared = proto.encode_frame_shared(**frameArgs())
+    for object_ids, objects, removed in (([1, 2], [PLAYER, TREE], []), ([3], [ARROW], [1, 2]), ([], [], [])):
+        data = shared + proto.encode_frame_objects(4, object_ids, objects, removed)
+        assert data == proto.encode_frame(4, object_ids, objects, removed, **frameArgs())
+        msg = proto.decode_message(data)
+        assert (msg["object_ids"], msg["info"]["objects"], msg["removed"]) == (object_ids, objects, removed)
+
+def test_match_frames_share_their_start():
+    match = game_server.Match(0, [(env_utils.AgentScripts.BasicAgent(), 2, "raider")])
+    for player_id in (match.add_player("defender"), match.add_player("raider")):
+        match.clients[player_id] = SimpleNamespace(player_id=player_id, view_id=player_id, action=None, name=None, ack=0, keyframe=0, interest={})
+    for _ in range(20):
+        (_, first), (_, second) = match.tick()
+    # re-encoding the decoded objects gives back the per-client part, what is left is the shared start
+    msg = proto.decode_message(first)
+    end = len(first) - len(proto.encode_frame_objects(msg["baseline"], msg["object_ids"], msg["info"]["objects"], msg["removed"]))
+    assert first[:end] == second[:end]
+    assert first[end:] != second[end:]
+
+def test_slow_clients_drop_the_oldest_frames():
+    async def run():
+        server_sock, client_sock = socket.socketpair()
+        reader, writer = await asyncio.open_connection(sock=server_sock)
+        client = game_server.ClientConnection(reader, writer, 1, "raider", max_pending=2)
+        # queued before the writer gets to run, as when a client falls behind
+        for i in range(5):
+            client.put(proto.encode_register(str(i)))
+        await client.close()
+        client_sock.settimeout(1)
+        return client.dropped, [proto.recv_msg(client_sock) for _ in range(3)]
+    dropped, received = asyncio.run(run())
+    assert dropped == 3
+    assert received == [{"type": "register", "team": "3"}, {"type": "register", "team": "4"}, None]
@@ -0,0 +1,75 @@
+import random
+
+import pytest
+
+from raiders import RaiderEnvironment
+from replay_utils import ReplayRecorder, ReplayPlayer, encodeAction, decodeAction, parseReplay, STEP, LZMA
+
+
+def recordedGame(random_actions, steps=120, seed=7):
+    env = RaiderEnvironment(render_mode=None, obs_mode=None)
+    for id_, team in ((1, "defender"), (2, "raider"), (3, "raider")):
+        env.addPlayer(id_, team)
+    recorder = ReplayRecorder(compression=LZMA)
+    recorder.attach(env)
+    env.reset(seed=seed)
+    rng = random.Random(seed)
+    for t in range(steps):
+        if t == steps//2:
+            env.removePlayer(3)
+        env.step(random_actions(rng, env.players))
+    return env, recorder
+
+def test_action_codes_round_trip():
+    for ax in range(3):
+        for active in range(10):
+            for angle in range(5):
+                action = [ax, 2-ax, active, (ax+active) % 2, angle]
+                assert decodeAction(encodeAction(action)) == action
+
+@pytest.mark.parametrize("action", [[3, 1, 0, 0, 2], [1, 1, -1, 0, 2], [1, 1, 0, 0, 2.5], [1, 1, 0, 0]])
+def test_invalid_actions_are_not_recorded(action, random_actions):
+    env, recorder = recordedGame(random_actions, steps=5)
+    before, t = bytes(recorder.buf), env.t
+    with pytest.raises((AssertionError, ValueError)):
+        env.step({1: action, 2: [1, 1, 0, 0, 2]})
+    assert bytes(recorder.buf) == before and env.t == t
+
+def test_replay_reproduces_game(random_actions, fingerprint):
+    env, recorder = recordedGame(random_actions)
+    data = recorder.getBytes()
+    assert sum(event[0] == STEP for event in parseReplay(data)) == 120
+
+    player = ReplayPlayer(data)
+    player.play()
+    assert fingerprint(player.env) == fingerprint(env)
+
+def test_seek_matches_straight_play(random_actions, fingerprint):
+    _, recorder = recordedGame(random_actions)
+    player = ReplayPlayer(recorder.getBytes(), snapshot_interval=25)
+    player.play()
+    reference = ReplayPlayer(recorder.getBytes(), snapshot_interval=0)
+    for tick in (90, 30, 55, 120, 0):
+        player.seek(tick)
+        reference.restart()
+        reference.play(tick)
+        assert fingerprint(player.env) == fingerprint(reference.env)
+
+def test_recording_pauses_at_set_state(random_actions, fingerprint):
+    env, recorder = recordedGame(random_actions, steps=20)
+    state = env.getState()
+    rng = random.Random(1)
+    for _ in range(10):
+        env.step(random_actions(rng, env.players))
+    env.addPlayer(4, "defender")
+    env.setState(state)
+    for _ in range(5):
+        env.step(random_actions(rng, env.players))
+    env.reset(seed=11)
+    for _ in range(30):
+        env.step(random_actions(rng, env.players))
+
+    player = ReplayPlayer(recorder.getBytes())
+    assert len(player) == 20 + 10 + 30
+    player.play()
+    assert fingerprint(player.env) == fingerprint(env)
@@ -0,0 +1,38 @@
+import os
+
+import pygame
+
+import sprite_atlas
+from raiders import RaiderEnvironment, spriteParameters, COLORS
+
+
+def buildSprites():
+    env = RaiderEnvironment(render_mode=None, obs_mode=None)
+    return {key: sprite for key, sprite in env.buildSprites().items() if isinstance(key, tuple)}
+
+def test_atlas_round_trip(tmp_path):
+    sprites = buildSprites()
+    path = str(tmp_path / "atlas.bin")
+    sprite_atlas.saveAtlas(path, sprites)
+    assert os.listdir(tmp_path) == ["atlas.bin"]
+
+    loaded = sprite_atlas.loadAtlas(path)
+    assert set(loaded) == set(sprites)
+    for key, sprite in sprites.items():
+        assert loaded[key].get_size() == sprite.get_size()
+        assert pygame.image.tostring(loaded[key], "RGB") == pygame.image.tostring(sprite, "RGB")
+        assert loaded[key].get_colorkey() == (0, 0, 0, 255)
+
+def test_missing_atlas(tmp_path):
+    assert sprite_atlas.loadAtlas(str(tmp_path / "missing.bin")) is None
+
+def test_atlas_path_follows_parameters(monkeypatch):
+    params = spriteParameters()
+    path = sprite_atlas.atlasPath(params)
+    assert path == sprite_atlas.atlasPath(spriteParameters())
+    assert os.path.dirname(path) == "assets_cache"
+
+    colors = dict(COLORS, green=(0, 255, 0))
+    assert sprite_atlas.atlasPath(spriteParameters(colors)) != path
+    monkeypatch.setattr(sprite_atlas, "ATLAS_VERSION", sprite_atlas.ATLAS_VERSION + 1)
+    assert sprite_atlas.atlasPath(params) != path
@@ -0,0 +1,93 @@
+import pickle
+import random
+
+import numpy as np
+
+from raiders import RaiderEnvironment
+
+
+def makeEnv(obs_mode=None):
+    env = RaiderEnvironment(render_mode=None, obs_mode=obs_mode)
+    for id_, team in ((1, "defender"), (2, "defender"), (3, "raider"), (4, "raider")):
+        env.addPlayer(id_, team)
+    return env
+
+def playOn(env, actions, fingerprint):
+    prints = []
+    for action in actions:
+        env.step(action)
+        prints.append(fingerprint(env))
+    return prints
+
+def test_restore_continues_the_same_game(random_actions, fingerprint):
+    rng = random.Random(3)
+    env = makeEnv()
+    env.reset(seed=3)
+    for _ in range(120):
+        env.step(random_actions(rng, env.players))
+    state = env.getState()
+    actions = [random_actions(rng, env.players) for _ in range(120)]
+    expected = playOn(env, actions, fingerprint)
+
+    # into a fresh env, into the env the snapshot came from, and after pickling
+    other = makeEnv()
+    other.reset(seed=11)
+    other.setState(state)
+    assert playOn(other, actions, fingerprint) == expected
+    env.setState(state)
+    assert playOn(env, actions, fingerprint) == expected
+    env.setState(pickle.loads(pickle.dumps(state)))
+    assert playOn(env, actions, fingerprint) == expected
+
+def test_snapshot_is_left_untouched(random_actions):
+    rng = random.Random(5)
+    env = makeEnv()
+    env.reset(seed=5)
+    for _ in range(60):
+        env.step(random_actions(rng, env.players))
+    state = env.getState()
+    before = pickle.dumps(state)
+    env.setState(state)
+    for _ in range(60):
+        env.step(random_actions(rng, env.players))
+    assert pickle.dumps(state) == before
+
+def test_restored_observations_match(random_actions):
+    rng = random.Random(8)
+    env = makeEnv(obs_mode="tensor")
+    env.reset(seed=8)
+    for _ in range(80):
+        env.step(random_actions(rng, env.players))
+    state = env.getState()
+    action = random_actions(rng, env.players)
+    expected, *_ = env.step(action)
+
+    other = makeEnv(obs_mode="tensor")
+    other.reset(seed=1)
+    other.setState(state)
+    obs, *_ = other.step(action)
+    for id_ in expected:
+        for key in ("vector_obs", "entities", "mask"):
+            np.testing.assert_array_equal(obs[id_][key], expected[id_][key])
+
+def test_owner_removed_before_its_objects(random_actions, fingerprint):
+    rng = random.Random(6)
+    env = makeEnv()
+    env.reset(seed=6)
+    owner = env.players[3]
+    for _ in range(400):
+        env.step(random_actions(rng, env.players))
+        if any(getattr(obj, "player", None) is owner for obj in env.objects + env.dynamic_objects):
+            break
+    else:
+        raise AssertionError("player 3 never built or fired anything")
+    env.removePlayer(3)
+
+    state = pickle.loads(pickle.dumps(env.getState()))
+    actions = [random_actions(rng, env.players) for _ in range(60)]
+    expected = playOn(env, actions, fingerprint)
+    other = makeEnv()
+    other.reset(seed=1)
+    other.setState(state)
+    assert 3 not in other.players
+    assert playOn(other, actions, fingerprint) == expected
@@ -0,0 +1,51 @@
+import math
+import random
+
+import numpy as np
+
+from raiders import sweepCircle
+
+
+def sweepLoop(pos, dx, dy, subframes, target_pos, target_reach, map_size):
+    # one subframe at a time, the way projectiles used to step
+    x, y = pos
+    xs, ys = [], []
+    exit_frame = hit_frame = subframes
+    hit_idx = -1
+    for frame in range(subframes):
+        x += dx
+        y += dy
+        xs.append(x)
+        ys.append(y)
+        if exit_frame == subframes and not (0 <= x <= map_size[0]-1 and 0 <= y <= map_size[1]-1):
+            exit_frame = frame
+        if hit_frame == subframes:
+            for i, (tx, ty) in enumerate(target_pos):
+                if math.hypot(tx - x, ty - y) <= target_reach[i]:
+                    hit_frame, hit_idx = frame, i
+                    break
+    return xs, ys, exit_frame, hit_frame, hit_idx
+
+def test_sweep_matches_loop():
+    rng = random.Random(0)
+    map_size = (2000, 2000)
+    for _ in range(500):
+        pos = (rng.uniform(-10, 2010), rng.uniform(-10, 2010))
+        angle = rng.uniform(0, 2*math.pi)
+        speed = rng.uniform(1, 80)
+        subframes = rng.choice((1, 4, 8))
+        dx, dy = speed*math.cos(angle)/subframes, speed*math.sin(angle)/subframes
+        n = rng.randint(0, 6)
+        target_pos = np.array([(pos[0] + rng.uniform(-100, 100), pos[1] + rng.uniform(-100, 100)) for _ in range(n)], dtype=np.float64).reshape(-1, 2)
+        target_reach = np.array([rng.uniform(5, 40) for _ in range(n)], dtype=np.float64)
+
+        xs, ys, *rest = sweepCircle(pos, dx, dy, subframes, target_pos, target_reach, map_size)
+        loop_xs, loop_ys, *loop_rest = sweepLoop(pos, dx, dy, subframes, target_pos.tolist(), target_reach.tolist(), map_size)
+        # positions have to be bit for bit the same, projectiles carry them into the next step
+        assert xs.tolist() == loop_xs and ys.tolist() == loop_ys
+        assert rest == loop_rest
+
+def test_sweep_without_targets():
+    xs, ys, exit_frame, hit_frame, hit_idx = sweepCircle((5, 5), -2, 0, 4, np.zeros((0, 2)), np.zeros(0), (100, 100))
+    assert xs.tolist() == [3, 1, -1, -3]
+    assert (exit_frame, hit_frame, hit_idx) == (2, 4, -1)
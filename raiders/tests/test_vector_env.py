@@ -0,0 +1,41 @@
+import gc
+
+import numpy as np
+
+from vector_env import VectorRaiderEnv, SubprocVectorRaiderEnv
+
+
+def randomActions(rng, num_envs, num_players):
+    highs = np.array([3, 3, 10, 2, 5])
+    return rng.integers(0, highs, size=(num_envs, num_players, 5))
+
+def test_subproc_matches_in_process():
+    rng = np.random.default_rng(0)
+    local = VectorRaiderEnv(3, obs_mode="tensor")
+    remote = SubprocVectorRaiderEnv(3, num_workers=2, obs_mode="tensor")
+    try:
+        obs_a, obs_b = local.reset(seed=5), remote.reset(seed=5)
+        for key in ("vector_obs", "entities", "entity_mask"):
+            np.testing.assert_array_equal(obs_a[key], obs_b[key])
+        for _ in range(20):
+            actions = randomActions(rng, 3, 2)
+            obs_a, rew_a, done_a, _ = local.step(actions)
+            obs_b, rew_b, done_b, _ = remote.step(actions)
+            for key in ("vector_obs", "entities", "entity_mask"):
+                np.testing.assert_array_equal(obs_a[key], obs_b[key])
+            np.testing.assert_array_equal(rew_a, rew_b)
+            np.testing.assert_array_equal(done_a, done_b)
+    finally:
+        remote.close()
+
+def test_arrays_outlive_close():
+    env = SubprocVectorRaiderEnv(2, num_workers=1)
+    env.reset(seed=1)
+    obs, rewards, dones, _ = env.step(np.ones((2, 2, 5), dtype=np.int64))
+    saved = obs.vector_obs.copy()
+    env.close()
+    np.testing.assert_array_equal(obs.vector_obs, saved)
+    del env
+    gc.collect()
+    np.testing.assert_array_equal(obs.vector_obs, saved)
+    assert rewards.shape == (2, 2) and dones.shape == (2,)
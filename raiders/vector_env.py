@@ -0,0 +1,279 @@
+import os
+import multiprocessing as mp
+from multiprocessing import shared_memory
+
+import numpy as np
+from attrdict import AttrDict
+
+from raiders import RaiderEnvironment
+from obs_encoder import ObservationEncoder
+
+
+OBS_KEYS = ("vector_obs", "image_obs", "entities", "entity_mask")
+BUFFER_KEYS = OBS_KEYS + ("rewards", "dones")
+
+
+class VectorRaiderEnv():
+    '''
+    Steps num_envs independent RaiderEnvironments in lockstep.
+
+    Every game has the same roster: ids 1..defenders are defenders, the following raiders ids are
+    raiders. Players are stored along axis 1 of every batched array in id order.
+
+    actions: int array of shape (num_envs, players, 5), see BaseAgent.getAction for the layout
+    observations:
+        vector_obs: float32 array of shape (num_envs, players, 5)
+        image_obs: uint8 array of shape (num_envs, players, 150, 150, 3), only when image_obs=True
+        entities: float32 array of shape (num_envs, players, max_entities, 7) and
+        entity_mask: bool array of shape (num_envs, players, max_entities), only when
+                     obs_mode="tensor", see ObservationEncoder
+    rewards: float32 array of shape (num_envs, players), +1 for the winning team and -1 for the
+             losing team on the step a game ends, 0 otherwise
+    dones: bool array of shape (num_envs,)
+
+    Finished games are reset automatically, the observation returned for them is the first
+    observation of the new game. The final observation is kept in infos[i].final_observation.
+    '''
+
+    def __init__(self, num_envs, defenders=1, raiders=1, render_mode=None, image_obs=False, obs_mode="dict", max_entities=64, buffers=None):
+        self.num_envs = num_envs
+        self.num_players = defenders + raiders
+        self.image_obs = image_obs
+        self.obs_mode = obs_mode
+
+        self.envs = [RaiderEnvironment(render_mode=render_mode, obs_mode=obs_mode, max_entities=max_entities) for _ in range(num_envs)]
+        self.ids = tuple(range(1, self.num_players+1))
+        self.teams = np.array([1]*defenders + [2]*raiders, dtype=np.int8)
+        for env in self.envs:
+            for id_, team in zip(self.ids, self.teams):
+                env.addPlayer(id_, "defender" if team == 1 else "raider")
+
+        # buffers can be passed in so observations are written straight into externally owned memory
+        self.buffers = buffers if buffers is not None else self.allocateBuffers(num_envs, self.num_players, image_obs, obs_mode, max_entities)
+
+    @staticmethod
+    def bufferShapes(num_envs, num_players, image_obs=False, obs_mode="dict", max_entities=64):
+        shapes = {
+            "vector_obs": ((num_envs, num_players, 5), np.float32),
+            "rewards": ((num_envs, num_players), np.float32),
+            "dones": ((num_envs,), bool),
+        }
+        if image_obs:
+            shapes["image_obs"] = ((num_envs, num_players, 150, 150, 3), np.uint8)
+        if obs_mode == "tensor":
+            shapes["entities"] = ((num_envs, num_players, max_entities, len(ObservationEncoder.FEATURES)), np.float32)
+            shapes["entity_mask"] = ((num_envs, num_players, max_entities), bool)
+        return shapes
+
+    @staticmethod
+    def allocateBuffers(num_envs, num_players, image_obs=False, obs_mode="dict", max_entities=64):
+        shapes = VectorRaiderEnv.bufferShapes(num_envs, num_players, image_obs, obs_mode, max_entities)
+        buffers = AttrDict({key: None for key in BUFFER_KEYS})
+        for key, (shape, dtype) in shapes.items():
+            buffers[key] = np.zeros(shape, dtype=dtype)
+        return buffers
+
+    def getObservations(self):
+        return AttrDict({key: self.buffers[key] for key in OBS_KEYS})
+
+    def writeObservation(self, i, observations):
+        env = self.envs[i]
+        for j, id_ in enumerate(self.ids):
+            self.buffers.vector_obs[i, j] = observations[id_].vector_obs
+            if self.image_obs:
+                self.buffers.image_obs[i, j] = env.getImageObs(id_)
+            if self.obs_mode == "tensor":
+                self.buffers.entities[i, j] = observations[id_].entities
+                self.buffers.entity_mask[i, j] = observations[id_].mask
+
+    def reset(self, seed=None):
+        # game i is seeded with seed+i, automatic resets keep drawing from each game's generator
+        self.buffers.rewards[:] = 0
+        self.buffers.dones[:] = False
+        for i, env in enumerate(self.envs):
+            observations, info = env.reset(seed=None if seed is None else seed+i)
+            self.writeObservation(i, observations)
+        return self.getObservations()
+
+    def step(self, actions):
+        actions = np.asarray(actions)
+        assert actions.shape == (self.num_envs, self.num_players, 5), f"Invalid actions shape: {actions.shape}"
+
+        infos = []
+        for i, env in enumerate(self.envs):
+            env_actions = {id_: actions[i, j].tolist() for j, id_ in enumerate(self.ids)}
+            observations, winning_team, done, term, info = env.step(env_actions)
+
+            self.buffers.rewards[i] = 0
+            self.buffers.dones[i] = done
+            info = AttrDict({"t": env.t, "winning_team": winning_team})
+            if done:
+                winner = 1 if winning_team == "defender" else 2
+                self.buffers.rewards[i] = np.where(self.teams == winner, 1, -1)
+                self.writeObservation(i, observations)
+                info.final_observation = AttrDict({
+                    key: None if self.buffers[key] is None else self.buffers[key][i].copy() for key in OBS_KEYS
+                })
+                observations, _ = env.reset()
+            self.writeObservation(i, observations)
+            infos.append(info)
+
+        return self.getObservations(), self.buffers.rewards, self.buffers.dones, infos
+
+    def close(self):
+        self.envs = []
+
+
+class SharedArrayOwner():
+    '''
+    Base of an array living in shared memory. Every view of the array keeps this, and with it the
+    mapping, alive, so the memory is only unmapped (SharedMemory.__del__) once no array uses it.
+    '''
+
+    def __init__(self, shm, shape, dtype):
+        self.shm = shm
+        self.__array_interface__ = np.ndarray(shape, dtype=dtype, buffer=shm.buf).__array_interface__
+
+def createSharedArray(shape, dtype):
+    nbytes = max(1, int(np.prod(shape)) * np.dtype(dtype).itemsize)
+    shm = shared_memory.SharedMemory(create=True, size=nbytes)
+    return shm, np.asarray(SharedArrayOwner(shm, shape, dtype))
+
+def attachSharedArray(name, shape, dtype):
+    shm = shared_memory.SharedMemory(name=name)
+    return shm, np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+
+def workerLoop(conn, layout, start, stop, env_kwargs):
+    # commands are (name, argument) tuples
+    # layout maps buffer name -> (shared memory name, shape, dtype) of the arrays covering every env
+    handles = []
+    arrays = {}
+    for key, (name, shape, dtype) in layout.items():
+        shm, array = attachSharedArray(name, shape, dtype)
+        handles.append(shm)
+        arrays[key] = array[start:stop]
+
+    buffers = AttrDict({key: arrays.get(key) for key in BUFFER_KEYS})
+    env = VectorRaiderEnv(stop-start, buffers=buffers, **env_kwargs)
+    actions = arrays["actions"]
+
+    try:
+        while True:
+            cmd, arg = conn.recv()
+            if cmd == "step":
+                _, _, _, infos = env.step(actions)
+                conn.send([dict(info) for info in infos])
+            elif cmd == "reset":
+                # arg is the seed of the first game in this worker's slice
+                env.reset(seed=arg)
+                conn.send(None)
+            elif cmd == "close":
+                break
+    except (KeyboardInterrupt, EOFError):
+        pass
+    finally:
+        env.close()
+        del buffers, arrays, actions, env
+        for shm in handles:
+            shm.close()
+        conn.close()
+
+
+class SubprocVectorRaiderEnv():
+    '''
+    Same interface as VectorRaiderEnv, but the games are split across worker processes.
+
+    Observations, rewards, dones and actions live in multiprocessing.shared_memory arrays that the
+    workers read and write in place, only short commands and per game infos go through the pipes.
+    The returned arrays are views into shared memory and are overwritten by the next step.
+
+    close() stops the workers and unlinks the shared memory, arrays returned before keep their last
+    contents and stay readable, the memory is unmapped once the last of them is garbage collected.
+    '''
+
+    def __init__(self, num_envs, num_workers=None, defenders=1, raiders=1, render_mode=None, image_obs=False, obs_mode="dict", max_entities=64, context=None):
+        self.num_envs = num_envs
+        self.num_players = defenders + raiders
+        self.num_workers = max(1, min(num_envs, num_workers or os.cpu_count() or 1))
+        self.closed = False
+
+        shapes = VectorRaiderEnv.bufferShapes(num_envs, self.num_players, image_obs, obs_mode, max_entities)
+        shapes["actions"] = ((num_envs, self.num_players, 5), np.int64)
+
+        self.shared_memory = []
+        self.arrays = {}
+        layout = {}
+        for key, (shape, dtype) in shapes.items():
+            shm, array = createSharedArray(shape, dtype)
+            self.shared_memory.append(shm)
+            self.arrays[key] = array
+            layout[key] = (shm.name, shape, dtype)
+
+        env_kwargs = {
+            "defenders": defenders,
+            "raiders": raiders,
+            "render_mode": render_mode,
+            "image_obs": image_obs,
+            "obs_mode": obs_mode,
+            "max_entities": max_entities,
+        }
+
+        ctx = mp.get_context(context)
+        bounds = np.linspace(0, num_envs, self.num_workers+1).astype(int)
+        self.conns = []
+        self.processes = []
+        self.starts = [int(start) for start in bounds[:-1]]
+        for start, stop in zip(bounds[:-1], bounds[1:]):
+            parent_conn, child_conn = ctx.Pipe()
+            process = ctx.Process(target=workerLoop, args=(child_conn, layout, int(start), int(stop), env_kwargs), daemon=True)
+            process.start()
+            child_conn.close()
+            self.conns.append(parent_conn)
+            self.processes.append(process)
+
+    def getObservations(self):
+        return AttrDict({key: self.arrays.get(key) for key in OBS_KEYS})
+
+    def reset(self, seed=None):
+        for conn, start in zip(self.conns, self.starts):
+            conn.send(("reset", None if seed is None else seed+start))
+        for conn in self.conns:
+            conn.recv()
+        return self.getObservations()
+
+    def stepAsync(self, actions):
+        self.arrays["actions"][:] = actions
+        for conn in self.conns:
+            conn.send(("step", None))
+
+    def stepWait(self):
+        infos = []
+        for conn in self.conns:
+            infos.extend(AttrDict(info) for info in conn.recv())
+        return self.getObservations(), self.arrays["rewards"], self.arrays["dones"], infos
+
+    def step(self, actions):
+        self.stepAsync(actions)
+        return self.stepWait()
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        for conn in self.conns:
+            try:
+                conn.send(("close", None))
+            except (BrokenPipeError, OSError):
+                pass
+        for process in self.processes:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+        # only unlink, the mappings go away with the last array viewing them (see SharedArrayOwner)
+        self.arrays = {}
+        for shm in self.shared_memory:
+            shm.unlink()
+        self.shared_memory = []
+
+    def __del__(self):
+        self.close()